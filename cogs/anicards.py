@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import asyncio
 import random
 import string
 import typing as t
-from datetime import datetime, timedelta
+from dataclasses import replace
+from datetime import UTC, datetime, timedelta
+from functools import partial
 
 import discord
 from discord.ext import commands
@@ -13,22 +16,38 @@ import helpers.constant as constant
 import helpers.custom_check as custom_check
 import helpers.message as message
 import helpers.pillow as pillow
+import helpers.render as render
 import views.pagination_view as pagination_view
+import views.persistent as persistent
 import views.wish_view as wish_view
+from helpers.query import Query
 from models.anicard import Anicard
-from models.user import User
+from models.collection import CollectionFilter, CollectionPager, IndexedCollectionPager, count_collection
+from models.user import ANICARD_COLUMNS
 
 if t.TYPE_CHECKING:
     import asyncpg
-    from PIL import Image
 
     from launcher import Uwuily
 
+FETCH_ANICARD_BY_TAG = Query(
+    name="user_anicards.fetch_by_tag",
+    sql=f"""
+        SELECT {", ".join(ANICARD_COLUMNS.values())}
+        FROM user_anicards
+        JOIN minions ON user_anicards.minion_id = minions.minion_id
+        WHERE user_id = $1 AND tag = $2;
+    """,
+)
+
 
 class AnicardCog(commands.Cog):
     def __init__(self, bot: Uwuily) -> None:
         self.bot: Uwuily = bot
 
+    async def cog_load(self) -> None:
+        pagination_view.page_sources["collection"] = self.collection_page_source
+
     """
     ############################################################
     WISH
@@ -53,38 +72,25 @@ class AnicardCog(commands.Cog):
         return True
 
     async def update_last_wish_time(self, ctx: commands.Context, current_time: datetime) -> None:
-        await ctx.bot.db.execute(
-            """
-                UPDATE user_cooldowns
-                SET last_wish_ts = $1
-                WHERE user_id = $2
-            """,
-            current_time,
-            ctx.author.id,
+        await self.bot.cooldown_store.set(  # type: ignore
+            user_id=ctx.author.id,
+            column="last_wish_ts",
+            timestamp=current_time,
         )
 
     async def get_anicards(self, ctx: commands.Context, amount: int = 3) -> list[Anicard]:
-        query: list[asyncpg.Record] = await ctx.bot.db.fetch(
-            """
-                WITH selected_minions AS (
-                    SELECT minion_id
-                    FROM minions
-                    ORDER BY RANDOM ()
-                    LIMIT $1
-                )
-                UPDATE minions
-                SET current_codex = current_codex + 1
-                WHERE minion_id IN (
-                    SELECT minion_id
-                    FROM selected_minions
-                )
-                RETURNING minion_id, character, anime, original_aniclass, current_codex
-            """,
-            amount,
+        minion_catalog = self.bot.minion_catalog
+        minion_catalog.refresh_if_stale(db=ctx.bot.db)
+        minions = minion_catalog.sample(amount=amount)
+        codexes: dict[int, int] = await self.bot.codex_allocator.allocate(
+            db=ctx.bot.db,
+            minion_ids=[minion.minion_id for minion in minions],
         )
-        anicard_data: list[dict[str, t.Any]] = [dict(record) for record in query]
         anicards = []
-        for data in anicard_data:
+        for minion in minions:
+            # The minion was removed since the catalog was last refreshed.
+            if minion.minion_id not in codexes:
+                continue
             random_tag = "".join(
                 random.choices(
                     string.ascii_letters + string.digits,
@@ -92,29 +98,23 @@ class AnicardCog(commands.Cog):
                 ),
             ).upper()
             anicard = Anicard(
-                minion_id=data["minion_id"],
+                minion_id=minion.minion_id,
                 tag=random_tag,
-                character=data["character"],
-                anime=data["anime"],
+                character=minion.character,
+                anime=minion.anime,
                 is_shattered=False,
                 image_ver=1,
                 frame="T1",
-                aniclass=data["original_aniclass"],
-                codex=data["current_codex"],
+                aniclass=minion.original_aniclass,
+                codex=codexes[minion.minion_id],
             )
             anicards.append(anicard)
         return anicards
 
     async def draw_wish_canvas(self, anicards: list[Anicard]) -> discord.File:
-        wish_canvas_image_path = "assets/anicard/canvas.png"
-        wish_canvas: Image.Image = await pillow.get_image(image_path=wish_canvas_image_path)
-        for index, anicard in enumerate(anicards):
-            anicard_image: Image.Image = await anicard.draw_anicard()
-            x_position = 11 + (index * 465)
-            y_position = -10
-            wish_canvas.paste(anicard_image, (x_position, y_position), mask=anicard_image)
-        wish_file = pillow.buffer_bytes(image=wish_canvas)
-        return wish_file
+        specs = [anicard.to_spec() for anicard in anicards]
+        wish_image: pillow.EncodedImage = await self.bot.render.render_wish_canvas(specs=specs)  # type: ignore
+        return wish_image.to_file()
 
     async def add_wish_button(
         self,
@@ -128,6 +128,7 @@ class AnicardCog(commands.Cog):
                 ctx=ctx,
                 minion_id=anicard.minion_id,  # type: ignore
                 character=anicard.character,  # type: ignore
+                anime=anicard.anime,  # type: ignore
                 aniclass=anicard.aniclass,  # type: ignore
                 codex=int(anicard.codex),  # type: ignore
                 tag=anicard.tag,  # type: ignore
@@ -135,6 +136,26 @@ class AnicardCog(commands.Cog):
             )
             view.add_item(item=item)
 
+    def persistent_wish_view(
+        self,
+        ctx: commands.Context,
+        anicards: list[Anicard],
+        current_time: datetime,
+    ) -> discord.ui.View:
+        wished_at = int(current_time.replace(tzinfo=UTC).timestamp())
+        view = discord.ui.View(timeout=None)
+        for anicard in anicards:
+            item = wish_view.WishClaimButton(
+                owner_id=ctx.author.id,
+                wished_at=wished_at,
+                minion_id=anicard.minion_id,  # type: ignore
+                codex=int(anicard.codex),  # type: ignore
+                tag=anicard.tag,  # type: ignore
+                label=anicard.character.title(),  # type: ignore
+            )
+            view.add_item(item=item)
+        return persistent.detached(view)
+
     @commands.hybrid_command(
         name="wish",
         aliases=["w"],
@@ -144,11 +165,11 @@ class AnicardCog(commands.Cog):
     @custom_check.is_registered()
     @logger.catch
     async def wish(self, ctx: commands.Context) -> None:
-        user = User(user_id=ctx.author.id)
-        await user.fetch_data(ctx=ctx, get_cooldowns=True)
-
         current_time = datetime.utcnow()
-        last_wish_time: datetime = user.cooldowns["last_wish_ts"]
+        last_wish_time: datetime = await self.bot.cooldown_store.get(  # type: ignore
+            user_id=ctx.author.id,
+            column="last_wish_ts",
+        )
         can_make_wish: bool = await self.can_make_wish(
             ctx=ctx,
             last_wish_time=last_wish_time,
@@ -156,10 +177,27 @@ class AnicardCog(commands.Cog):
         )
         if not can_make_wish:
             return None
-        await self.update_last_wish_time(ctx=ctx, current_time=current_time)
 
         anicards: list[Anicard] = await self.get_anicards(ctx=ctx, amount=3)
-        wish_image_file: discord.File = await self.draw_wish_canvas(anicards=anicards)
+        try:
+            wish_image_file: discord.File = await self.draw_wish_canvas(anicards=anicards)
+        except render.RenderError:
+            for anicard in anicards:
+                self.bot.codex_allocator.release(minion_id=anicard.minion_id, codex=anicard.codex)  # type: ignore
+            await message.Send.error(
+                ctx=ctx,
+                message="Too many wishes are being made right now, please try again shortly.",
+            )
+            return None
+        await self.update_last_wish_time(ctx=ctx, current_time=current_time)
+        if persistent.PERSISTENT_VIEWS:
+            await ctx.send(
+                content=f"{ctx.author.mention} Select an Anicard!",
+                file=wish_image_file,
+                view=self.persistent_wish_view(ctx=ctx, anicards=anicards, current_time=current_time),
+            )
+            return None
+
         view = wish_view.WishView(ctx=ctx)
         await self.add_wish_button(ctx=ctx, anicards=anicards, view=view, current_time=current_time)
 
@@ -175,6 +213,8 @@ class AnicardCog(commands.Cog):
     ############################################################
     """
 
+    COLLECTION_PAGE_SIZE = 10
+
     ANICLASS_PREFIX = {
         "a": "⚜",
         "artisan": "⚜",
@@ -216,40 +256,117 @@ class AnicardCog(commands.Cog):
                 parsed_filter[field] = transform(key)
         return parsed_filter
 
-    def apply_filter(self, collection: list[Anicard], parsed_filter: dict[str, str]) -> list[Anicard]:
-        if parsed_filter["character"]:
-            collection = [minion for minion in collection if parsed_filter["character"] in str(minion.character)]
-        if parsed_filter["aniclass"]:
-            collection = [minion for minion in collection if parsed_filter["aniclass"] == minion.aniclass]
-        if parsed_filter["order"]:
-            collection = sorted(collection, key=lambda minion: getattr(minion, parsed_filter["order"]))
-        return collection
-
-    def paginate_collection(self, ctx: commands.Context, collection: list[Anicard]) -> list[discord.Embed]:
+    def collection_embed(
+        self,
+        owner: discord.abc.User,
+        anicards: list[Anicard],
+    ) -> discord.Embed:
         formatted_anicard_data = []
-        for anicard in collection:
+        for anicard in anicards:
             minion_text = f"`[{anicard.aniclass} {anicard.codex}] {anicard.character}` • `Tier {anicard.tier}` • `{anicard.tag}`\n"
             if anicard.is_shattered:
                 minion_text = f"*~~{minion_text}~~*"
             formatted_anicard_data.append(minion_text)
-        # Split the formatted_anicard_data into sublist of 10.
-        embed_description_sublist = [
-            formatted_anicard_data[n : n + 10] for n in range(0, len(formatted_anicard_data), 10)
-        ]
-        # Turn each sublist into an embed page.
-        embed_pages = []
-        for index, page in enumerate(embed_description_sublist):
-            embed_description = "".join(page)
-            embed_title = f"{ctx.author.name.title()}'s Anicard Collections"
-            collection_embed = discord.Embed(
-                title=embed_title,
-                description=embed_description,
-                color=constant.CustomColors.BLUE,
+        embed_title = f"{owner.name.title()}'s Anicard Collections"
+        return discord.Embed(
+            title=embed_title,
+            description="".join(formatted_anicard_data),
+            color=constant.CustomColors.BLUE,
+        )
+
+    async def collection_pager(
+        self,
+        user_id: int,
+        collection_filter: CollectionFilter,
+    ) -> tuple[int, CollectionPager | IndexedCollectionPager]:
+        """Number of Anicards the user owns and a pager over the ones matching the filter.
+
+        Answered from the user's collection index when it is cached. Otherwise the collection is
+        counted in SQL, and indexed if it is small enough, or else paged from the database.
+        """
+
+        indexes = self.bot.collection_indexes
+        index = indexes.get(user_id)
+        if index is None:
+            if collection_filter.character:
+                results = await self.bot.minion_search.search(db=self.bot.db, query=collection_filter.character)
+                collection_filter = replace(collection_filter, minion_ids=tuple(result.doc_id for result in results))
+            total, matched = await count_collection(
+                db=self.bot.db,
+                user_id=user_id,
+                collection_filter=collection_filter,
             )
-            footer_text = f"Page ({index+1}/{len(embed_description_sublist)})"
-            collection_embed.set_footer(text=footer_text)
-            embed_pages.append(collection_embed)
-        return embed_pages
+            if not total or total > indexes.max_user_cards:
+                pager = CollectionPager(
+                    db=self.bot.db,
+                    user_id=user_id,
+                    collection_filter=collection_filter,
+                    page_size=self.COLLECTION_PAGE_SIZE,
+                    total=matched,
+                )
+                return total, pager
+            index = await indexes.load(db=self.bot.db, user_id=user_id)
+        anicards = index.query(collection_filter=collection_filter)
+        return index.card_count, IndexedCollectionPager(anicards=anicards, page_size=self.COLLECTION_PAGE_SIZE)
+
+    async def collection_page(
+        self,
+        ctx: commands.Context,
+        pager: CollectionPager | IndexedCollectionPager,
+        page: int,
+    ) -> discord.Embed:
+        anicards: list[Anicard] = await pager.get_page(page=page)
+        return self.collection_embed(owner=ctx.author, anicards=anicards)
+
+    async def render_collection_page(
+        self,
+        pager: CollectionPager | IndexedCollectionPager,
+        page: int,
+    ) -> pillow.EncodedImage:
+        anicards: list[Anicard] = await pager.get_page(page=page)
+        keys = [anicard.to_spec().base_layer_key for anicard in anicards]
+        return await self.bot.render.render_gallery_page(keys=keys)  # type: ignore
+
+    async def collection_page_content(
+        self,
+        owner: discord.abc.User,
+        pager: CollectionPager | IndexedCollectionPager,
+        page: int,
+    ) -> tuple[discord.Embed, list[discord.File]]:
+        """Embed and attachments of a persistent collection page, its image rendered within the image budget."""
+
+        embed = self.collection_embed(owner=owner, anicards=await pager.get_page(page=page))
+        try:
+            image = await asyncio.wait_for(
+                self.render_collection_page(pager=pager, page=page),
+                timeout=pagination_view.PaginationView.IMAGE_BUDGET,
+            )
+        except TimeoutError:
+            return embed, []
+        except Exception:
+            logger.exception(f"Could not render the image of page {page + 1}.")
+            return embed, []
+        embed.set_image(url=f"attachment://{image.filename}")
+        return embed, [image.to_file()]
+
+    async def collection_page_source(
+        self,
+        owner: discord.abc.User,
+        state: str,
+        page: int,
+    ) -> tuple[discord.Embed, list[discord.File], int]:
+        """Persistent collection pages, ``state`` is the collection filter as the owner typed it."""
+
+        parsed_filter = CollectionFilter(**self.parse_filter(collection_filter=state))
+        _, pager = await self.collection_pager(user_id=owner.id, collection_filter=parsed_filter)
+        if not pager.total:
+            # The Anicards were removed since the collection was sent.
+            embed = self.collection_embed(owner=owner, anicards=[])
+            embed.description = "No Anicards found with the given filter."
+            return embed, [], pager.page_count
+        page = max(0, min(page, pager.page_count - 1))
+        embed, files = await self.collection_page_content(owner=owner, pager=pager, page=page)
+        return embed, files, pager.page_count
 
     @commands.hybrid_command(
         name="collection",
@@ -260,35 +377,87 @@ class AnicardCog(commands.Cog):
     @custom_check.is_registered()
     @logger.catch
     async def collection(self, ctx: commands.Context, *, collection_filter: str | None) -> None:
-        user = User(user_id=ctx.author.id)
-        await user.fetch_data(ctx=ctx, get_anicards=True)
-        if not user.anicards:
+        parsed_filter = CollectionFilter(**self.parse_filter(collection_filter=collection_filter))
+        total, pager = await self.collection_pager(user_id=ctx.author.id, collection_filter=parsed_filter)
+        if not total:
             await message.Send.error(
                 ctx=ctx,
                 message=("You do not have any Anicards in your collection! Try wishing for one by typing `uwu wish`."),
             )
             return None
-
-        parsed_filter: dict[str, str] = self.parse_filter(collection_filter=collection_filter)
-        filtered_collection: list[Anicard] = self.apply_filter(
-            collection=user.anicards,
-            parsed_filter=parsed_filter,
-        )
-        if not filtered_collection:
+        if not pager.total:
             await message.Send.error(
                 ctx=ctx,
                 message="No Anicards found with the given filter. Try again with a different filter.",
             )
             return None
-        paginated_collection: list[discord.Embed] = self.paginate_collection(
+
+        if persistent.PERSISTENT_VIEWS:
+            persistent_view = pagination_view.persistent_page_view(
+                source="collection",
+                owner_id=ctx.author.id,
+                state=collection_filter or "",
+                page=0,
+                page_count=pager.page_count,
+            )
+            # Filters too long for a custom id fall back to a view held in memory.
+            if persistent_view:
+                embed, files = await self.collection_page_content(owner=ctx.author, pager=pager, page=0)
+                pagination_view.page_footer(embed=embed, page=0, page_count=pager.page_count)
+                await ctx.send(content=ctx.author.mention, embed=embed, files=files, view=persistent_view)
+                return None
+
+        view = pagination_view.PaginationView(
             ctx=ctx,
-            collection=filtered_collection,
+            page_provider=partial(self.collection_page, ctx, pager),
+            page_count=pager.page_count,
+            image_provider=partial(self.render_collection_page, pager),
         )
-
-        view = pagination_view.PaginationView(ctx=ctx, embeds=paginated_collection)
-        view.view_message = await ctx.send(content=ctx.author.mention, embed=paginated_collection[0], view=view)
+        embed, files = await view.page_content(page=0)
+        view.view_message = await ctx.send(content=ctx.author.mention, embed=embed, files=files, view=view)
         await ctx.send("gglol!")
 
+    """
+    ############################################################
+    VIEW
+    ############################################################
+    """
+
+    async def get_anicard(self, ctx: commands.Context, anicard_tag: str) -> Anicard | None:
+        query: asyncpg.Record | None = await FETCH_ANICARD_BY_TAG.fetchrow(ctx.bot.db, ctx.author.id, anicard_tag)
+        return Anicard.from_record(query) if query else None
+
+    @commands.hybrid_command(
+        name="view",
+        aliases=["v"],
+        description="View one of your Anicards.",
+    )
+    @commands.cooldown(1, constant.Cooldown.COMMAND, commands.BucketType.user)
+    @custom_check.is_registered()
+    @logger.catch
+    async def view(self, ctx: commands.Context, anicard_tag: str) -> None:
+        anicard_tag = anicard_tag.upper()
+        anicard: Anicard | None = await self.get_anicard(ctx=ctx, anicard_tag=anicard_tag)
+        if not anicard:
+            await message.Send.error(ctx=ctx, message=f"You are not the owner of Anicard with tag `{anicard_tag}`!")
+            return None
+
+        try:
+            anicard_image: pillow.EncodedImage = await self.bot.render.render_anicard(spec=anicard.to_spec())  # type: ignore
+        except render.RenderError:
+            await message.Send.error(
+                ctx=ctx,
+                message="Too many Anicards are being drawn right now, please try again shortly.",
+            )
+            return None
+        anicard_text = (
+            f"`[{anicard.aniclass} {anicard.codex}] {anicard.character}` • `Tier {anicard.tier}` • `{anicard.tag}`"
+        )
+        await ctx.send(
+            content=f"{ctx.author.mention} {anicard_text}",
+            file=anicard_image.to_file(),
+        )
+
 
 async def setup(bot: Uwuily) -> None:
     await bot.add_cog(AnicardCog(bot))
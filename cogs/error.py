@@ -5,11 +5,12 @@ from typing import TYPE_CHECKING
 import discord
 from discord.ext import commands
 
+import views.persistent as persistent
 from helpers.constant import CustomColors
 from helpers.custom_check import NotRegistered
 from helpers.message import Send
 from models.user import User
-from views.confirm_view import send_confirm_view
+from views.confirm_view import confirm_actions, persistent_confirm_view, send_confirm_view
 
 if TYPE_CHECKING:
     from launcher import Uwuily
@@ -26,6 +27,9 @@ class ErrorHandlerCog(commands.Cog):
             NotRegistered: self.handle_not_registered,
         }
 
+    async def cog_load(self) -> None:
+        confirm_actions["register"] = self.confirm_register
+
     @commands.Cog.listener()
     async def on_command_error(self, ctx: commands.Context, error: Exception) -> None:
         handler = self.error_handlers.get(type(error))  # type: ignore
@@ -78,6 +82,14 @@ class ErrorHandlerCog(commands.Cog):
             welcome_embed_thumbnail = self.bot.user.avatar
             welcome_embed.set_thumbnail(url=welcome_embed_thumbnail)
 
+        if persistent.PERSISTENT_VIEWS:
+            await ctx.send(
+                content=ctx.author.mention,
+                embed=welcome_embed,
+                view=persistent_confirm_view(action="register", owner_id=ctx.author.id),
+            )
+            return None
+
         register_confirm_result: bool | None = await send_confirm_view(
             ctx=ctx,
             message=ctx.author.mention,
@@ -86,9 +98,18 @@ class ErrorHandlerCog(commands.Cog):
         if not register_confirm_result:
             return None
         user = User(user_id=ctx.author.id)
-        await user.register(ctx=ctx)
+        await user.register(bot=self.bot)
+        await ctx.send(content=ctx.author.mention, embed=self.thankyou_embed())
+
+    async def confirm_register(self, interaction: discord.Interaction, result: bool) -> None:
+        if not result:
+            return None
+        user = User(user_id=interaction.user.id)
+        await user.register(bot=self.bot)
+        await interaction.followup.send(content=interaction.user.mention, embed=self.thankyou_embed())
 
-        thankyou_embed = discord.Embed(
+    def thankyou_embed(self) -> discord.Embed:
+        return discord.Embed(
             title="Thank you for accepting our terms!",
             description=(
                 "Join our [Support Server](https://discord.gg/FvegU7Vdx5) to play Uwuily Bot with other players, "
@@ -97,7 +118,6 @@ class ErrorHandlerCog(commands.Cog):
             ),
             color=CustomColors.YELLOW,
         )
-        await ctx.send(content=ctx.author.mention, embed=thankyou_embed)
 
 
 async def setup(bot: Uwuily) -> None:
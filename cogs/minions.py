@@ -2,17 +2,65 @@ from __future__ import annotations
 
 import typing as t
 
+import discord
 from discord.ext import commands
 from loguru import logger
 
 import helpers.constant as constant
 import helpers.custom_check as custom_check
 import helpers.message as message
-from models.user import User
+from helpers.query import Query
+from models.user import LOCK_USER_CONFIGS
 
 if t.TYPE_CHECKING:
+    import asyncpg
+
     from launcher import Uwuily
-    from models.anicard import Anicard
+
+# Summons the Anicard only if every check passes, and reports which check failed otherwise.
+SUMMON_ANICARD = Query(
+    name="user_anicards.summon",
+    sql="""
+        WITH target AS (
+            SELECT user_anicards.anicard_id, user_anicards.is_shattered, minions.character
+            FROM user_anicards
+            JOIN minions ON user_anicards.minion_id = minions.minion_id
+            WHERE user_anicards.user_id = $1 AND user_anicards.tag = $2
+        ), summoned AS (
+            SELECT minions.character
+            FROM user_anicards
+            JOIN minions ON user_anicards.minion_id = minions.minion_id
+            WHERE user_anicards.user_id = $1 AND user_anicards.is_summoned
+        ), user_config AS (
+            SELECT max_minion
+            FROM user_configs
+            WHERE user_id = $1
+        ), updated AS (
+            UPDATE user_anicards
+            SET
+                is_summoned = TRUE,
+                location = 'Elegrand'
+            FROM target
+            WHERE user_anicards.anicard_id = target.anicard_id
+                AND NOT target.is_shattered
+                AND target.character NOT IN (SELECT character FROM summoned)
+                AND (SELECT COUNT(*) FROM summoned) < (SELECT max_minion FROM user_config)
+            RETURNING user_anicards.anicard_id
+        )
+        SELECT
+            target.character,
+            (SELECT max_minion FROM user_config) AS max_minion,
+            CASE
+                WHEN target.anicard_id IS NULL THEN 'not_owner'
+                WHEN EXISTS (SELECT 1 FROM updated) THEN 'summoned'
+                WHEN target.character IN (SELECT character FROM summoned) THEN 'already_summoned'
+                WHEN target.is_shattered THEN 'shattered'
+                ELSE 'max_minion'
+            END AS result
+        FROM (SELECT 1) AS placeholder
+        LEFT JOIN target ON TRUE;
+    """,
+)
 
 
 class MinionCog(commands.Cog):
@@ -25,59 +73,28 @@ class MinionCog(commands.Cog):
     ############################################################
     """
 
-    async def try_summon_minion(
-        self,
-        ctx: commands.Context,
-        anicard_tag: str,
-        user_anicards: list[Anicard],
-        user_max_minion: int,
-    ) -> None:
-        anicard_tag_data: Anicard | None = next(
-            (anicard for anicard in user_anicards if anicard.tag == anicard_tag),
-            None,
-        )
-        if not anicard_tag_data:
+    async def try_summon_minion(self, ctx: commands.Context, anicard_tag: str) -> None:
+        async with ctx.bot.db.acquire() as connection, connection.transaction():
+            await LOCK_USER_CONFIGS.execute(connection, ctx.author.id)
+            summon: asyncpg.Record = await SUMMON_ANICARD.fetchrow(connection, ctx.author.id, anicard_tag)
+
+        character = summon["character"]
+        if summon["result"] == "not_owner":
             anicard_not_owner_msg = f"You are not the owner of Anicard with tag `{anicard_tag}`!"
             await message.Send.error(ctx=ctx, message=anicard_not_owner_msg)
-            return None
-
-        # Check if user already has the minion summoned.
-        anicard_tag_character = anicard_tag_data.character
-        unique_summon = (
-            sum(1 for anicard in user_anicards if anicard.is_summoned and anicard.character == anicard_tag_character)
-            < 1
-        )
-        if not unique_summon:
-            unique_summon_msg = f"`{anicard_tag_character}` is already summoned!"
+        elif summon["result"] == "already_summoned":
+            unique_summon_msg = f"`{character}` is already summoned!"
             await message.Send.error(ctx=ctx, message=unique_summon_msg)
-            return None
-
-        # Check if the anicard is shattered.
-        if anicard_tag_data.is_shattered:
+        elif summon["result"] == "shattered":
             anicard_shattered_msg = "You can not summon a shattered Anicard!"
             await message.Send.error(ctx=ctx, message=anicard_shattered_msg)
-            return None
-
-        # Check if user has reached max minion limit.
-        total_summoned = sum(anicard.is_summoned for anicard in user_anicards)  # type: ignore
-        if user_max_minion <= total_summoned:
-            max_summon_msg = f"You can only summon `{user_max_minion}` minions at a time!"
+        elif summon["result"] == "max_minion":
+            max_summon_msg = f"You can only summon `{summon['max_minion']}` minions at a time!"
             await message.Send.error(ctx=ctx, message=max_summon_msg)
-            return None
-
-        # Summon the minion.
-        await ctx.bot.db.execute(
-            """
-            UPDATE user_anicards
-            SET
-                is_summoned = TRUE,
-                location = 'Elegrand'
-            WHERE anicard_id = $1
-            """,
-            anicard_tag_data.anicard_id,
-        )
-        summoned_msg = f"`{anicard_tag_character}` with tag of `{anicard_tag}` has been summoned to `Elegrand`!"
-        await message.Send.success(ctx=ctx, message=summoned_msg)
+        else:
+            self.bot.collection_indexes.set_summoned(user_id=ctx.author.id, tag=anicard_tag)
+            summoned_msg = f"`{character}` with tag of `{anicard_tag}` has been summoned to `Elegrand`!"
+            await message.Send.success(ctx=ctx, message=summoned_msg)
 
     @commands.hybrid_command(
         name="summon",
@@ -88,18 +105,41 @@ class MinionCog(commands.Cog):
     @custom_check.is_registered()
     @logger.catch
     async def summon(self, ctx: commands.Context, anicard_tag: str) -> None:
-        user = User(user_id=ctx.author.id)
-        await user.fetch_data(ctx=ctx, get_anicards=True, get_configs=True)
-
-        anicard_tag = anicard_tag.upper()
-        anicards: list[Anicard] = user.anicards
-        user_max_minion: int = user.configs["max_minion"]
-        await self.try_summon_minion(
-            ctx=ctx,
-            anicard_tag=anicard_tag,
-            user_anicards=anicards,
-            user_max_minion=user_max_minion,
+        await self.try_summon_minion(ctx=ctx, anicard_tag=anicard_tag.upper())
+
+    """
+    ############################################################
+    SEARCH
+    ############################################################
+    """
+
+    SEARCH_LIMIT = 10
+
+    @commands.hybrid_command(
+        name="search",
+        aliases=["sr"],
+        description="Search minions by character or anime.",
+    )
+    @commands.cooldown(1, constant.Cooldown.COMMAND, commands.BucketType.user)
+    @logger.catch
+    async def search(self, ctx: commands.Context, *, query: str) -> None:
+        results = await self.bot.minion_search.search(db=self.bot.db, query=query, limit=self.SEARCH_LIMIT)
+        if not results:
+            await message.Send.error(ctx=ctx, message=f"No minion found for `{query}`.")
+            return None
+
+        catalog = self.bot.minion_catalog
+        lines = []
+        for result in results:
+            minion = catalog.find(minion_id=result.doc_id)
+            name = f"{minion.character} • {minion.anime}" if minion else f"#{result.doc_id}"
+            lines.append(f"`{result.score:.0%}` {name}")
+        embed = discord.Embed(
+            title=f"Minions matching {query}",
+            description="\n".join(lines),
+            color=constant.CustomColors.BLUE,
         )
+        await ctx.send(embed=embed)
 
 
 async def setup(bot: Uwuily) -> None:
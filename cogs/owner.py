@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import typing as t
+
+import discord
+from discord.ext import commands
+
+import helpers.constant as constant
+from helpers.query import query_stats
+
+if t.TYPE_CHECKING:
+    from launcher import Uwuily
+
+
+class OwnerCog(commands.Cog):
+    def __init__(self, bot: Uwuily) -> None:
+        self.bot: Uwuily = bot
+
+    """
+    ############################################################
+    QUERY STATS
+    ############################################################
+    """
+
+    QUERY_STATS_LIMIT = 15
+
+    @commands.command(name="querystats", aliases=["qs"], hidden=True)
+    @commands.is_owner()
+    async def querystats(self, ctx: commands.Context) -> None:
+        stats = query_stats()
+        if not stats:
+            await ctx.send("No query has run yet.")
+            return None
+
+        lines = [f"{'query':<36} {'calls':>7} {'rows':>8} {'p50':>8} {'p99':>8} {'total':>9}"]
+        for name, summary in list(stats.items())[: self.QUERY_STATS_LIMIT]:
+            lines.append(
+                f"{name[:36]:<36} {summary['calls']:>7} {summary['rows']:>8} "
+                f"{summary['p50_ms']:>6.1f}ms {summary['p99_ms']:>6.1f}ms {summary['total_ms'] / 1000:>8.1f}s",
+            )
+        table = "\n".join(lines)
+        embed = discord.Embed(
+            title="Query Stats",
+            description=f"```\n{table}\n```",
+            color=constant.CustomColors.BLUE,
+        )
+        embed.set_footer(text=f"{len(stats)} queries, slowest in total first")
+        await ctx.send(embed=embed)
+
+    """
+    ############################################################
+    POOL STATS
+    ############################################################
+    """
+
+    @commands.command(name="poolstats", aliases=["ps"], hidden=True)
+    @commands.is_owner()
+    async def poolstats(self, ctx: commands.Context) -> None:
+        stats = self.bot.db.stats()
+        buckets = "\n".join(f"{bucket:>9} {count:>8}" for bucket, count in stats["wait_buckets"].items())
+        embed = discord.Embed(
+            title="Database Pool",
+            description=(
+                f"`{stats['in_use']}` in use, `{stats['idle']}` idle of `{stats['size']}` connection(s) "
+                f"(min `{stats['min_size']}`, max `{stats['max_size']}`, limit `{stats['limit']}`)\n"
+                f"`{stats['acquires']}` acquires, wait mean `{stats['mean_wait_ms']:.1f}ms`, "
+                f"p95 `{stats['p95_wait_ms']:.1f}ms`, max `{stats['max_wait_ms']:.1f}ms`\n"
+                f"```\n{buckets}\n```"
+            ),
+            color=constant.CustomColors.BLUE,
+        )
+        await ctx.send(embed=embed)
+
+
+async def setup(bot: Uwuily) -> None:
+    await bot.add_cog(OwnerCog(bot))
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+
+from loguru import logger
+from PIL import Image
+
+MAGIC = b"UWUPACK1"
+# Magic, then the byte length of the JSON index that follows it.
+HEADER = struct.Struct("<8sI")
+ALIGNMENT = 64
+# Modes Pillow can wrap around a buffer without copying it.
+MAPPABLE_MODES = ("L", "RGBA")
+
+
+def align(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class AssetPack:
+    """Read-only view over a pack of raw, pre-decoded images written by ``tools.pack_assets``.
+
+    The pack is memory-mapped and images are built directly over the mapping, so every process
+    that opens the same pack shares its pages instead of decoding its own copy. Images handed
+    out are read-only and must be copied before they are drawn on.
+    """
+
+    def __init__(self, pack_path: str) -> None:
+        with open(pack_path, mode="rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, index_length = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{pack_path} is not an asset pack.")
+        index_start = HEADER.size
+        self.index: dict[str, dict] = json.loads(self.buffer[index_start : index_start + index_length])
+        # Image offsets in the index are relative to the aligned start of the pixel data.
+        self.data_start = align(index_start + index_length)
+        self.images: dict[str, Image.Image] = {}
+        self.drop_stale_entries()
+
+    def drop_stale_entries(self) -> None:
+        """Forget entries whose source image changed after the pack was built."""
+
+        for image_path, entry in list(self.index.items()):
+            try:
+                stat = os.stat(image_path)
+            except FileNotFoundError:
+                continue
+            if stat.st_size != entry["source_size"] or stat.st_mtime_ns != entry["source_mtime_ns"]:
+                logger.warning(f"{image_path} changed after the asset pack was built, it will be decoded instead.")
+                del self.index[image_path]
+
+    def get(self, image_path: str) -> Image.Image | None:
+        image = self.images.get(image_path)
+        if image is not None:
+            return image
+        entry = self.index.get(image_path)
+        if entry is None:
+            return None
+        mode, size = entry["mode"], (entry["width"], entry["height"])
+        start = self.data_start + entry["offset"]
+        data = memoryview(self.buffer)[start : start + entry["length"]]
+        image = Image.frombuffer(mode, size, data, "raw", mode, 0, 1)
+        self.images[image_path] = image
+        return image
+
+    @classmethod
+    def load(cls, pack_path: str) -> AssetPack | None:
+        if not os.path.exists(pack_path):
+            return None
+        try:
+            asset_pack = cls(pack_path=pack_path)
+        except (OSError, ValueError) as error:
+            logger.warning(f"Could not load asset pack {pack_path}: {error!r}")
+            return None
+        logger.debug(f"Loaded asset pack {pack_path} with {len(asset_pack.index)} image(s).")
+        return asset_pack
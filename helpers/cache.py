@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import threading
+import typing as t
+from collections import OrderedDict
+
+K = t.TypeVar("K")
+V = t.TypeVar("V")
+
+
+class LRUCache(t.Generic[K, V]):
+    """Least recently used cache bounded by the total byte size of its values.
+
+    ``sizeof`` returns the size in bytes of a value. Values larger than ``max_bytes`` are
+    never stored. Access is guarded by a lock, so the cache can be shared by render threads.
+    """
+
+    def __init__(self, max_bytes: int, sizeof: t.Callable[[V], int]) -> None:
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries: OrderedDict[K, tuple[V, int]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: K) -> V | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: K, value: V) -> None:
+        size = self.sizeof(value)
+        with self.lock:
+            old_entry = self.entries.pop(key, None)
+            if old_entry is not None:
+                self.current_bytes -= old_entry[1]
+            if size > self.max_bytes:
+                return None
+            self.entries[key] = (value, size)
+            self.current_bytes += size
+            self.evict()
+
+    def resize(self, key: K) -> None:
+        """Measure a value again after it changed in place, evicting to stay within ``max_bytes``."""
+
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, old_size = entry
+        size = self.sizeof(value)
+        with self.lock:
+            # Replaced or evicted while it was measured.
+            if self.entries.get(key) is not entry:
+                return None
+            self.current_bytes += size - old_size
+            if size > self.max_bytes:
+                del self.entries[key]
+                self.current_bytes -= size
+                return None
+            self.entries[key] = (value, size)
+            self.evict()
+
+    def evict(self) -> None:
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def discard(self, key: K) -> None:
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.current_bytes -= entry[1]
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
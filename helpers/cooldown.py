@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import time
+import typing as t
+
+from loguru import logger
+
+from helpers.query import Query
+
+if t.TYPE_CHECKING:
+    from datetime import datetime
+
+    import asyncpg
+
+COOLDOWN_COLUMNS = ("last_wish_ts", "last_weeble_ts")
+
+FETCH_COOLDOWNS = Query(
+    name="user_cooldowns.fetch",
+    sql=f"""
+        SELECT {", ".join(COOLDOWN_COLUMNS)}
+        FROM user_cooldowns
+        WHERE user_id = $1;
+    """,
+)
+UPDATE_COOLDOWN = {
+    column: Query(
+        name=f"user_cooldowns.update_{column}",
+        sql=f"""
+            UPDATE user_cooldowns
+            SET {column} = $1
+            WHERE user_id = $2
+        """,
+    )
+    for column in COOLDOWN_COLUMNS
+}
+
+
+class CooldownStore:
+    """Write-behind cache of the ``user_cooldowns`` timestamps.
+
+    Timestamps are read from the database once per user and then answered from memory. Updates
+    are applied in memory and written back in batches every ``flush_interval`` seconds, and on
+    ``close``. With ``write_through`` every update is written immediately instead. Users whose
+    timestamps were not used for ``ttl`` seconds and have nothing left to write are evicted.
+    """
+
+    def __init__(
+        self,
+        db: asyncpg.Pool,
+        flush_interval: float = 5.0,
+        ttl: float = 3600.0,
+        write_through: bool = False,
+    ) -> None:
+        self.db = db
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.write_through = write_through
+        # user_id -> column -> timestamp
+        self.cooldowns: dict[int, dict[str, datetime]] = {}
+        self.last_used: dict[int, float] = {}
+        self.dirty: set[tuple[int, str]] = set()
+        self.flush_task: asyncio.Task[None] | None = None
+        self.flush_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        self.flush_task = asyncio.create_task(self.flush_forever())
+
+    async def close(self) -> None:
+        if self.flush_task:
+            self.flush_task.cancel()
+            # A flush in flight puts its updates back in ``dirty`` once it is cancelled.
+            with contextlib.suppress(asyncio.CancelledError):
+                await self.flush_task
+            self.flush_task = None
+        await self.flush()
+
+    async def load(self, user_id: int) -> dict[str, datetime]:
+        record: asyncpg.Record | None = await FETCH_COOLDOWNS.fetchrow(self.db, user_id)
+        cooldowns = dict(record) if record else {}
+        # Keep anything set while the row was being read.
+        cooldowns.update(self.cooldowns.get(user_id, {}))
+        self.cooldowns[user_id] = cooldowns
+        return cooldowns
+
+    async def get(self, user_id: int, column: str) -> datetime | None:
+        cooldowns = self.cooldowns.get(user_id)
+        if cooldowns is None or column not in cooldowns:
+            cooldowns = await self.load(user_id=user_id)
+        self.last_used[user_id] = time.monotonic()
+        return cooldowns.get(column)
+
+    async def set(self, user_id: int, column: str, timestamp: datetime) -> None:
+        if column not in UPDATE_COOLDOWN:
+            raise ValueError(f"Unknown cooldown {column!r}, expected one of {', '.join(COOLDOWN_COLUMNS)}.")
+        self.cooldowns.setdefault(user_id, {})[column] = timestamp
+        self.last_used[user_id] = time.monotonic()
+        self.dirty.add((user_id, column))
+        if self.write_through:
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write every pending update, one batched statement per column.
+
+        Flushes run one at a time, so an older batch never commits over a newer one.
+        """
+
+        async with self.flush_lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, set()
+            updates: dict[str, list[tuple[datetime, int]]] = {}
+            for user_id, column in dirty:
+                updates.setdefault(column, []).append((self.cooldowns[user_id][column], user_id))
+            try:
+                async with self.db.acquire() as connection, connection.transaction():
+                    for column, rows in updates.items():
+                        await UPDATE_COOLDOWN[column].executemany(connection, rows)
+            except BaseException:
+                # Keep the updates for the next flush, which writes their latest value.
+                self.dirty |= dirty
+                raise
+
+    def evict_expired(self) -> None:
+        expire_before = time.monotonic() - self.ttl
+        dirty_users = {user_id for user_id, _ in self.dirty}
+        for user_id, last_used in list(self.last_used.items()):
+            if last_used < expire_before and user_id not in dirty_users:
+                del self.last_used[user_id]
+                self.cooldowns.pop(user_id, None)
+
+    async def flush_forever(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception(f"Could not write {len(self.dirty)} cooldown update(s), retrying later.")
+            self.evict_expired()
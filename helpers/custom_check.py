@@ -1,24 +1,93 @@
+from __future__ import annotations
+
+import typing as t
+from array import array
+from bisect import bisect_left
+
 from discord.ext import commands
+from loguru import logger
+
+from helpers.query import Query
+
+if t.TYPE_CHECKING:
+    import asyncpg
+
+FETCH_USER_IDS = Query(
+    name="users.fetch_ids",
+    sql="""
+        SELECT user_id
+        FROM users
+        ORDER BY user_id;
+    """,
+)
+IS_REGISTERED = Query(
+    name="users.is_registered",
+    sql="""
+        SELECT EXISTS(
+            SELECT 1
+            FROM users
+            WHERE user_id = $1
+        )
+    """,
+)
 
 
 class NotRegistered(commands.CheckFailure):
     pass
 
 
+class RegisteredUserCache:
+    """In-process set of registered user ids, so gated commands skip the database.
+
+    Registration is permanent, so ids are only ever added. The ids loaded at startup are kept in
+    a sorted ``array`` (8 bytes per id) and searched with bisect, ids registered afterwards go in
+    a small set. A miss is not trusted, the check falls back to the database and learns the id.
+    """
+
+    def __init__(self) -> None:
+        self.warm_ids: array[int] = array("Q")
+        self.new_ids: set[int] = set()
+        self.hits = 0
+        self.misses = 0
+
+    async def warm(self, db: asyncpg.Pool) -> None:
+        records = await FETCH_USER_IDS.fetch(db)
+        self.warm_ids = array("Q", (record["user_id"] for record in records))
+        self.new_ids.clear()
+        logger.info(f"Registered user cache warmed with {len(self.warm_ids)} user(s).")
+
+    def contains(self, user_id: int) -> bool:
+        if user_id in self.new_ids:
+            return True
+        index = bisect_left(self.warm_ids, user_id)
+        return index < len(self.warm_ids) and self.warm_ids[index] == user_id
+
+    def add(self, user_id: int) -> None:
+        if not self.contains(user_id):
+            self.new_ids.add(user_id)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "users": len(self.warm_ids) + len(self.new_ids),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
 def is_registered():  # noqa: ANN201
     async def is_registered_check(ctx: commands.Context) -> bool:
-        is_registered: bool = await ctx.bot.db.fetchval(
-            """
-            SELECT EXISTS(
-                SELECT 1
-                FROM users
-                WHERE user_id = $1
-            )
-            """,
-            ctx.author.id,
-        )
+        registered_users: RegisteredUserCache = ctx.bot.registered_users
+        if registered_users.contains(ctx.author.id):
+            registered_users.hits += 1
+            return True
+        registered_users.misses += 1
+
+        is_registered: bool = await IS_REGISTERED.fetchval(ctx.bot.db, ctx.author.id)
         if not is_registered:
             raise NotRegistered()
+        registered_users.add(ctx.author.id)
         return True
 
     return commands.check(is_registered_check)
@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import time
+import typing as t
+from collections import deque
+from contextlib import asynccontextmanager
+
+import asyncpg
+from loguru import logger
+
+if t.TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+# Upper bounds of the acquire wait histogram buckets, the last bucket is unbounded.
+WAIT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class WaitHistogram:
+    def __init__(self) -> None:
+        self.counts = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.total = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def record(self, duration: float) -> None:
+        self.counts[bisect.bisect_left(WAIT_BUCKETS_MS, duration * 1000)] += 1
+        self.total += 1
+        self.total_time += duration
+        self.max_time = max(self.max_time, duration)
+
+    def buckets(self) -> dict[str, int]:
+        labels = [f"<={bound}ms" for bound in WAIT_BUCKETS_MS] + [f">{WAIT_BUCKETS_MS[-1]}ms"]
+        return dict(zip(labels, self.counts, strict=True))
+
+
+class ConnectionLimit:
+    """First come, first served semaphore whose limit can be changed while it is held."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self.waiters: deque[asyncio.Future[None]] = deque()
+
+    async def acquire(self) -> None:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before the cancellation, pass it on.
+                self.release()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self.wake_waiters()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = limit
+        self.wake_waiters()
+
+    def wake_waiters(self) -> None:
+        while self.waiters and self.active < self.limit:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+
+class DatabasePool:
+    """``asyncpg.Pool`` that measures how long callers wait for a connection.
+
+    Every ``acquire`` (including the ones behind ``fetch``, ``execute`` and friends) is timed
+    into a histogram. In adaptive mode, the number of connections handed out at once starts at
+    ``min_size`` and is raised towards ``max_size`` while the p95 wait stays above
+    ``target_wait``, and lowered again when waits are short; idle connections above the limit
+    are then closed by the pool after ``max_inactive_connection_lifetime``.
+    """
+
+    def __init__(
+        self,
+        pool: asyncpg.Pool,
+        min_size: int,
+        max_size: int,
+        adaptive: bool = False,
+        target_wait: float = 0.01,
+        adjust_interval: float = 10.0,
+    ) -> None:
+        self.pool = pool
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_wait = target_wait
+        self.adjust_interval = adjust_interval
+        self.histogram = WaitHistogram()
+        self.recent_waits: deque[float] = deque(maxlen=512)
+        self.limit = ConnectionLimit(limit=max(1, min_size)) if adaptive else None
+        self.adjusted_at = time.monotonic()
+
+    @classmethod
+    async def create(
+        cls,
+        dsn: str,
+        min_size: int = 10,
+        max_size: int = 10,
+        max_queries: int = 50000,
+        max_inactive_connection_lifetime: float = 300.0,
+        statement_cache_size: int = 100,
+        command_timeout: float | None = None,
+        adaptive: bool = False,
+        target_wait: float = 0.01,
+    ) -> DatabasePool:
+        pool = await asyncpg.create_pool(
+            dsn,
+            min_size=min_size,
+            max_size=max_size,
+            max_queries=max_queries,
+            max_inactive_connection_lifetime=max_inactive_connection_lifetime,
+            statement_cache_size=statement_cache_size,
+            command_timeout=command_timeout,
+            server_settings={"application_name": "uwuily"},
+        )
+        logger.info(f"Database pool created with {min_size} to {max_size} connection(s), adaptive={adaptive}.")
+        return cls(pool=pool, min_size=min_size, max_size=max_size, adaptive=adaptive, target_wait=target_wait)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[asyncpg.Connection]:
+        start_time = time.perf_counter()
+        if self.limit:
+            await self.limit.acquire()
+        try:
+            async with self.pool.acquire() as connection:
+                self.record_wait(time.perf_counter() - start_time)
+                yield connection
+        finally:
+            if self.limit:
+                self.limit.release()
+
+    def record_wait(self, duration: float) -> None:
+        self.histogram.record(duration)
+        self.recent_waits.append(duration)
+        if self.limit and time.monotonic() - self.adjusted_at >= self.adjust_interval:
+            self.adjust_limit()
+
+    def wait_percentile(self, percent: float) -> float:
+        if not self.recent_waits:
+            return 0.0
+        ordered = sorted(self.recent_waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def adjust_limit(self) -> None:
+        self.adjusted_at = time.monotonic()
+        current = self.limit.limit  # type: ignore
+        p95_wait = self.wait_percentile(95)
+        if p95_wait > self.target_wait and current < self.max_size:
+            new_limit = min(self.max_size, current + max(1, current // 2))
+        elif p95_wait < self.target_wait / 4 and current > self.min_size:
+            new_limit = current - 1
+        else:
+            return
+        self.recent_waits.clear()
+        self.limit.set_limit(new_limit)  # type: ignore
+        logger.info(f"Database connection limit {current} -> {new_limit} (p95 wait {p95_wait * 1000:.1f}ms).")
+
+    async def fetch(self, query: str, *args: t.Any, timeout: float | None = None) -> list[asyncpg.Record]:
+        async with self.acquire() as connection:
+            return await connection.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args: t.Any, timeout: float | None = None) -> asyncpg.Record | None:
+        async with self.acquire() as connection:
+            return await connection.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args: t.Any, column: int = 0, timeout: float | None = None) -> t.Any:
+        async with self.acquire() as connection:
+            return await connection.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query: str, *args: t.Any, timeout: float | None = None) -> str:
+        async with self.acquire() as connection:
+            return await connection.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args: t.Iterable[t.Sequence], timeout: float | None = None) -> None:
+        async with self.acquire() as connection:
+            await connection.executemany(command, args, timeout=timeout)
+
+    async def close(self) -> None:
+        await self.pool.close()
+
+    def stats(self) -> dict[str, t.Any]:
+        size = self.pool.get_size()
+        idle = self.pool.get_idle_size()
+        histogram = self.histogram
+        return {
+            "size": size,
+            "in_use": size - idle,
+            "idle": idle,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "limit": self.limit.limit if self.limit else self.max_size,
+            "acquires": histogram.total,
+            "mean_wait_ms": histogram.total_time / histogram.total * 1000 if histogram.total else 0.0,
+            "p95_wait_ms": self.wait_percentile(95) * 1000,
+            "max_wait_ms": histogram.max_time * 1000,
+            "wait_buckets": histogram.buckets(),
+        }
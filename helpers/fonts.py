@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from loguru import logger
+from PIL import ImageFont
+
+INSANIBC = "assets/font/Insanibc.ttf"
+EMOJI = "assets/font/Emoji.ttf"
+
+# Every (font, size) pair used by the Anicard layout.
+CARD_FONTS: tuple[tuple[str, int], ...] = (
+    (INSANIBC, 55),
+    (INSANIBC, 35),
+    (INSANIBC, 25),
+    (EMOJI, 25),
+)
+
+
+class FontRegistry:
+    """Process wide store of parsed fonts, so each (font, size) pair is only loaded once."""
+
+    def __init__(self) -> None:
+        self.fonts: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}
+
+    def get(self, font_path: str, size: int) -> ImageFont.FreeTypeFont:
+        key = (font_path, size)
+        font = self.fonts.get(key)
+        if font is None:
+            font = ImageFont.truetype(font_path, size)
+            self.fonts[key] = font
+        return font
+
+    def warm(self, fonts: tuple[tuple[str, int], ...] = CARD_FONTS) -> None:
+        for font_path, size in fonts:
+            self.get(font_path=font_path, size=size)
+        logger.debug(f"Font registry warmed with {len(self.fonts)} font(s).")
+
+
+registry = FontRegistry()
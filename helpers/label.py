@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import math
+import typing as t
+from dataclasses import dataclass
+
+from decouple import config
+from PIL import Image
+
+from helpers.cache import LRUCache
+
+if t.TYPE_CHECKING:
+    from PIL import ImageFont
+
+# (text, font path, font size, stroke width, subpixel start)
+LabelKey = tuple[str, str, int, int, tuple[float, float]]
+
+
+@dataclass(frozen=True)
+class LabelTile:
+    """Pre-rasterized stroked text, kept as separate stroke and fill masks.
+
+    Pasting the stroke colour through ``stroke_mask`` and then the fill colour through
+    ``fill_mask`` gives the same pixels as ``ImageDraw.text`` with a stroke.
+    """
+
+    width: int
+    stroke_mask: Image.Image | None
+    stroke_offset: tuple[int, int]
+    fill_mask: Image.Image
+    fill_offset: tuple[int, int]
+
+
+def label_size(tile: LabelTile) -> int:
+    stroke_size = tile.stroke_mask.width * tile.stroke_mask.height if tile.stroke_mask else 0
+    return stroke_size + tile.fill_mask.width * tile.fill_mask.height
+
+
+label_cache: LRUCache[LabelKey, LabelTile] = LRUCache(
+    max_bytes=config("LABEL_CACHE_MAX_BYTES", default=32 * 1024 * 1024, cast=int),
+    sizeof=label_size,
+)
+
+
+def rasterize_mask(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    stroke_width: int,
+    start: tuple[float, float],
+) -> tuple[Image.Image, tuple[int, int]]:
+    mask, offset = font.getmask2(text, mode="L", stroke_width=stroke_width, start=start)
+    # getmask2 hands back a raw imaging core, wrap it the same way Pillow does internally.
+    return Image.Image()._new(mask), offset
+
+
+def rasterize_label(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    stroke_width: int,
+    start: tuple[float, float] = (0.0, 0.0),
+) -> LabelTile:
+    width, _ = font.getsize(text)  # type: ignore
+    stroke_mask, stroke_offset = rasterize_mask(text, font, stroke_width, start) if stroke_width else (None, (0, 0))
+    fill_mask, fill_offset = rasterize_mask(text, font, 0, start)
+    return LabelTile(
+        width=width,
+        stroke_mask=stroke_mask,
+        stroke_offset=stroke_offset,
+        fill_mask=fill_mask,
+        fill_offset=fill_offset,
+    )
+
+
+def get_label(
+    text: str,
+    font: ImageFont.FreeTypeFont,
+    stroke_width: int,
+    start: tuple[float, float] = (0.0, 0.0),
+    cache: bool = True,
+) -> LabelTile:
+    """Get a label tile, rasterizing it once for static text.
+
+    Pass ``cache=False`` for one-off strings such as tags, so they do not push reusable
+    labels out of the cache.
+    """
+
+    if not cache:
+        return rasterize_label(text=text, font=font, stroke_width=stroke_width, start=start)
+    key = (text, str(font.path), font.size, stroke_width, start)
+    tile = label_cache.get(key)
+    if tile is None:
+        tile = rasterize_label(text=text, font=font, stroke_width=stroke_width, start=start)
+        label_cache.put(key, tile)
+    return tile
+
+
+def paste_label(
+    image: Image.Image,
+    tile: LabelTile,
+    position: tuple[int, int],
+    fill: tuple[int, int, int],
+    stroke_fill: str,
+) -> None:
+    pos_x, pos_y = position
+    if tile.stroke_mask:
+        stroke_x, stroke_y = pos_x + tile.stroke_offset[0], pos_y + tile.stroke_offset[1]
+        stroke_box = (stroke_x, stroke_y, stroke_x + tile.stroke_mask.width, stroke_y + tile.stroke_mask.height)
+        image.paste(stroke_fill, stroke_box, mask=tile.stroke_mask)
+    fill_x, fill_y = pos_x + tile.fill_offset[0], pos_y + tile.fill_offset[1]
+    fill_box = (fill_x, fill_y, fill_x + tile.fill_mask.width, fill_y + tile.fill_mask.height)
+    image.paste(fill, fill_box, mask=tile.fill_mask)
+
+
+def draw_label(
+    image: Image.Image,
+    text: str,
+    position: tuple[float, float],
+    font: ImageFont.FreeTypeFont,
+    fill: tuple[int, int, int],
+    stroke_width: int,
+    stroke_fill: str,
+    centered: bool = False,
+    cache: bool = True,
+) -> None:
+    """Draw stroked text like ``ImageDraw.text``, from a cached label tile.
+
+    With ``centered`` the label is horizontally centered on the given x position.
+    """
+
+    start = (math.modf(position[0])[0], math.modf(position[1])[0])
+    tile = get_label(text=text, font=font, stroke_width=stroke_width, start=start, cache=cache)
+    pos_x, pos_y = int(position[0]), int(position[1])
+    if centered:
+        pos_x -= tile.width // 2
+    paste_label(image=image, tile=tile, position=(pos_x, pos_y), fill=fill, stroke_fill=stroke_fill)
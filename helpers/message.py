@@ -1,3 +1,4 @@
+import discord
 from discord.ext import commands
 
 from helpers.constant import CustomEmojis
@@ -12,12 +13,25 @@ class MessageTemplate:
 
 
 class Send:
+    """Messages to the author of a command, or to the user of an already answered interaction."""
+
+    @staticmethod
+    async def send(ctx: commands.Context | discord.Interaction, content: str) -> None:
+        if isinstance(ctx, discord.Interaction):
+            await ctx.followup.send(content=content)
+        else:
+            await ctx.send(content=content)
+
+    @staticmethod
+    def mention(ctx: commands.Context | discord.Interaction) -> str:
+        return ctx.user.mention if isinstance(ctx, discord.Interaction) else ctx.author.mention
+
     @staticmethod
-    async def success(ctx: commands.Context, message: str) -> None:
-        formatted_message = f"{CustomEmojis.SUCCESS} {ctx.author.mention} {message}"
-        await ctx.send(content=formatted_message)
+    async def success(ctx: commands.Context | discord.Interaction, message: str) -> None:
+        formatted_message = f"{CustomEmojis.SUCCESS} {Send.mention(ctx)} {message}"
+        await Send.send(ctx=ctx, content=formatted_message)
 
     @staticmethod
-    async def error(ctx: commands.Context, message: str) -> None:
-        formatted_message = f"{CustomEmojis.ERROR} {ctx.author.mention} {message}"
-        await ctx.send(content=formatted_message)
+    async def error(ctx: commands.Context | discord.Interaction, message: str) -> None:
+        formatted_message = f"{CustomEmojis.ERROR} {Send.mention(ctx)} {message}"
+        await Send.send(ctx=ctx, content=formatted_message)
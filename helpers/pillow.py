@@ -1,28 +1,122 @@
+from __future__ import annotations
+
+import time
+import typing as t
+from dataclasses import dataclass, field
 from io import BytesIO
 
-import aiofiles
 import discord
+from decouple import config
 from PIL import Image
 
-image_cache = {}
+from helpers.asset_pack import AssetPack
+from helpers.cache import LRUCache
+
+
+def image_size(image: Image.Image) -> int:
+    """Decoded size of an image in bytes."""
+
+    return image.width * image.height * len(image.getbands())
+
+
+image_cache: LRUCache[str, Image.Image] = LRUCache(
+    max_bytes=config("IMAGE_CACHE_MAX_BYTES", default=256 * 1024 * 1024, cast=int),
+    sizeof=image_size,
+)
+
+
+asset_pack: AssetPack | None = AssetPack.load(pack_path=config("ASSET_PACK", default="assets/anicard.pack"))
 
 
-async def open_image(image_path: str) -> Image.Image:
-    async with aiofiles.open(image_path, mode="rb") as f:
-        data = await f.read()
-        image = Image.open(BytesIO(data))
+def open_image(image_path: str) -> Image.Image:
+    image = Image.open(image_path)
+    image.load()
     return image
 
 
-async def get_image(image_path: str) -> Image.Image:
-    if image_path not in image_cache:
-        image_cache[image_path] = await open_image(image_path)
-    return image_cache[image_path].copy()
+def get_layer(image_path: str) -> Image.Image:
+    """Get a shared, cached image. It must only be read, e.g. as a paste source or a mask.
 
+    Images in the asset pack are served straight from its shared mapping instead of the cache.
+    """
 
-def buffer_bytes(image: Image.Image) -> discord.File:
+    if asset_pack:
+        image = asset_pack.get(image_path=image_path)
+        if image is not None:
+            return image
+    image = image_cache.get(image_path)
+    if image is None:
+        image = open_image(image_path)
+        image_cache.put(image_path, image)
+    return image
+
+
+def get_image(image_path: str) -> Image.Image:
+    """Get a private copy of a cached image that is safe to draw on."""
+
+    return get_layer(image_path=image_path).copy()
+
+
+@dataclass(frozen=True)
+class EncodeProfile:
+    """Trade-off between encode CPU time and upload size for rendered images."""
+
+    name: str
+    format: str
+    params: dict[str, t.Any] = field(default_factory=dict)
+    max_width: int | None = None
+
+
+ENCODE_PROFILES: dict[str, EncodeProfile] = {
+    # Pillow's WebP defaults, the historical output.
+    "default": EncodeProfile(name="default", format="webp"),
+    "fast": EncodeProfile(name="fast", format="webp", params={"quality": 80, "method": 0}),
+    "small": EncodeProfile(name="small", format="webp", params={"quality": 60, "method": 4}),
+    "lossless": EncodeProfile(name="lossless", format="webp", params={"lossless": True, "quality": 0, "method": 0}),
+    "png": EncodeProfile(name="png", format="png", params={"compress_level": 1}),
+    # Downscaled preview sized for mobile clients.
+    "mobile": EncodeProfile(name="mobile", format="webp", params={"quality": 75, "method": 2}, max_width=700),
+}
+
+
+def get_profile(name: str) -> EncodeProfile:
+    if name not in ENCODE_PROFILES:
+        raise ValueError(f"Unknown encode profile {name!r}, expected one of {', '.join(ENCODE_PROFILES)}.")
+    return ENCODE_PROFILES[name]
+
+
+@dataclass(frozen=True)
+class EncodedImage:
+    data: bytes
+    format: str
+    encode_time: float = 0.0
+
+    @property
+    def size(self) -> int:
+        return len(self.data)
+
+    @property
+    def filename(self) -> str:
+        return f"image.{self.format}"
+
+    def to_file(self) -> discord.File:
+        return bytes_file(data=self.data, filename=self.filename)
+
+
+def encode_image(image: Image.Image, profile: EncodeProfile = ENCODE_PROFILES["default"]) -> EncodedImage:
+    start_time = time.perf_counter()
+    if profile.max_width and image.width > profile.max_width:
+        height = round(image.height * profile.max_width / image.width)
+        image = image.resize((profile.max_width, height), Image.Resampling.LANCZOS)
     buffer = BytesIO()
-    image.save(fp=buffer, format="webp")
-    buffer.seek(0)
-    image_file = discord.File(fp=buffer, filename="image.webp")
-    return image_file
+    image.save(fp=buffer, format=profile.format, **profile.params)
+    encode_time = time.perf_counter() - start_time
+    return EncodedImage(data=buffer.getvalue(), format=profile.format, encode_time=encode_time)
+
+
+def bytes_file(data: bytes, filename: str = "image.webp") -> discord.File:
+    return discord.File(fp=BytesIO(data), filename=filename)
+
+
+def buffer_bytes(image: Image.Image) -> discord.File:
+    return encode_image(image=image).to_file()
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import time
+import typing as t
+from collections import deque
+
+if t.TYPE_CHECKING:
+    import asyncpg
+
+    Executor = asyncpg.Pool | asyncpg.Connection
+
+# Number of recent calls the latency percentiles of a query are computed from.
+LATENCY_WINDOW = 1024
+
+
+class QueryStats:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.rows = 0
+        self.total_time = 0.0
+        self.durations: deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, duration: float, rows: int) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.total_time += duration
+        self.durations.append(duration)
+
+    def percentile(self, percent: float) -> float:
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+    def summary(self) -> dict[str, float]:
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": self.total_time * 1000,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+        }
+
+
+def status_rows(status: str) -> int:
+    """Rows affected according to a command status such as ``UPDATE 3``."""
+
+    count = status.rsplit(" ", 1)[-1]
+    return int(count) if count.isdigit() else 0
+
+
+class Query:
+    """A named SQL statement, timed every time it runs.
+
+    Statements run through asyncpg, which prepares them once per pooled connection and reuses
+    the prepared statement afterwards. Statements built at runtime pass their ``sql`` when they
+    run, and share the stats of their name.
+    """
+
+    def __init__(self, name: str, sql: str = "") -> None:
+        registered = registry.get(name)
+        # Reloading a cog or model declares its queries again, they keep their stats.
+        if registered is not None and registered.sql != sql:
+            raise ValueError(f"A different query named {name!r} is already registered.")
+        self.name = name
+        self.sql = sql
+        self.stats = registered.stats if registered else QueryStats()
+        registry[name] = self
+
+    async def fetch(self, executor: Executor, *args: t.Any, sql: str | None = None) -> list[asyncpg.Record]:
+        start_time = time.perf_counter()
+        records = await executor.fetch(sql or self.sql, *args)
+        self.stats.record(duration=time.perf_counter() - start_time, rows=len(records))
+        return records
+
+    async def fetchrow(self, executor: Executor, *args: t.Any, sql: str | None = None) -> asyncpg.Record | None:
+        start_time = time.perf_counter()
+        record = await executor.fetchrow(sql or self.sql, *args)
+        self.stats.record(duration=time.perf_counter() - start_time, rows=record is not None)
+        return record
+
+    async def fetchval(self, executor: Executor, *args: t.Any, sql: str | None = None) -> t.Any:
+        start_time = time.perf_counter()
+        value = await executor.fetchval(sql or self.sql, *args)
+        self.stats.record(duration=time.perf_counter() - start_time, rows=1)
+        return value
+
+    async def execute(self, executor: Executor, *args: t.Any, sql: str | None = None) -> str:
+        start_time = time.perf_counter()
+        status = await executor.execute(sql or self.sql, *args)
+        self.stats.record(duration=time.perf_counter() - start_time, rows=status_rows(status))
+        return status
+
+    async def executemany(self, executor: Executor, args: list[t.Sequence[t.Any]], sql: str | None = None) -> None:
+        start_time = time.perf_counter()
+        await executor.executemany(sql or self.sql, args)
+        self.stats.record(duration=time.perf_counter() - start_time, rows=len(args))
+
+
+registry: dict[str, Query] = {}
+
+
+def query_stats() -> dict[str, dict[str, float]]:
+    """Stats of every query that ran at least once, slowest in total first."""
+
+    ran = [query for query in registry.values() if query.stats.calls]
+    ran.sort(key=lambda query: query.stats.total_time, reverse=True)
+    return {query.name: query.stats.summary() for query in ran}
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import dataclasses
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import typing as t
+import uuid
+from concurrent.futures import BrokenExecutor, Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+import aiofiles
+import aiofiles.os
+from loguru import logger
+from PIL import Image
+
+import helpers.fonts as fonts
+import helpers.pillow as pillow
+from helpers.cache import LRUCache
+from models.anicard import get_thumbnail_layer, warm_base_layers
+
+if t.TYPE_CHECKING:
+    from helpers.pillow import EncodedImage, EncodeProfile
+    from models.anicard import AnicardSpec, BaseLayerKey
+
+T = t.TypeVar("T")
+
+WISH_CANVAS_PATH = "assets/anicard/canvas.png"
+
+GALLERY_COLUMNS = 5
+GALLERY_PADDING = 8
+
+# Bump whenever the card layout changes, so cached renders of the old layout are not served.
+RENDER_VERSION = 1
+
+
+class RenderError(Exception):
+    """Base class for render service failures."""
+
+
+class RenderBusyError(RenderError):
+    """Raised when the render queue stays full for longer than the queue timeout."""
+
+
+class RenderTimeoutError(RenderError):
+    """Raised when a render job does not finish within the job timeout."""
+
+
+def init_worker(base_layers: list[BaseLayerKey]) -> None:
+    """Pre-warm per-worker state, so the first job does not pay for it."""
+
+    fonts.registry.warm()
+    warm_base_layers(keys=base_layers)
+
+
+def render_wish_canvas(specs: list[AnicardSpec], profile: EncodeProfile) -> EncodedImage:
+    wish_canvas: Image.Image = pillow.get_image(image_path=WISH_CANVAS_PATH)
+    for index, spec in enumerate(specs):
+        anicard_image: Image.Image = spec.draw()
+        x_position = 11 + (index * 465)
+        y_position = -10
+        wish_canvas.paste(anicard_image, (x_position, y_position), mask=anicard_image)
+    return pillow.encode_image(image=wish_canvas, profile=profile)
+
+
+def render_anicard(spec: AnicardSpec, profile: EncodeProfile) -> EncodedImage:
+    return pillow.encode_image(image=spec.draw(), profile=profile)
+
+
+def render_gallery_page(keys: list[BaseLayerKey], profile: EncodeProfile) -> EncodedImage:
+    """Grid of text-free Anicard thumbnails, in the order given."""
+
+    thumbnails = [get_thumbnail_layer(key=key) for key in keys]
+    thumbnail_width, thumbnail_height = thumbnails[0].size
+    columns = min(len(thumbnails), GALLERY_COLUMNS)
+    rows = math.ceil(len(thumbnails) / columns)
+    gallery_size = (
+        columns * (thumbnail_width + GALLERY_PADDING) + GALLERY_PADDING,
+        rows * (thumbnail_height + GALLERY_PADDING) + GALLERY_PADDING,
+    )
+    gallery = Image.new("RGBA", gallery_size, (0, 0, 0, 0))
+    for index, thumbnail in enumerate(thumbnails):
+        row, column = divmod(index, columns)
+        x_position = GALLERY_PADDING + column * (thumbnail_width + GALLERY_PADDING)
+        y_position = GALLERY_PADDING + row * (thumbnail_height + GALLERY_PADDING)
+        gallery.paste(thumbnail, (x_position, y_position), mask=thumbnail)
+    return pillow.encode_image(image=gallery, profile=profile)
+
+
+class RenderOutputCache:
+    """Content addressed cache of encoded Anicard images.
+
+    Entries are keyed by a hash of every field that affects the image, so an entry never
+    goes stale. The memory tier is bounded by ``max_bytes``; the optional disk tier under
+    ``directory`` survives restarts.
+    """
+
+    def __init__(self, max_bytes: int, directory: str | None = None) -> None:
+        self.memory: LRUCache[str, bytes] = LRUCache(max_bytes=max_bytes, sizeof=len)
+        self.directory = directory
+        self.disk_hits = 0
+
+    @staticmethod
+    def key(spec: AnicardSpec, profile: EncodeProfile) -> str:
+        fields = [RENDER_VERSION, profile.name, *dataclasses.astuple(spec)]
+        return hashlib.sha256(json.dumps(fields, ensure_ascii=False).encode()).hexdigest()
+
+    def path(self, key: str, image_format: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.{image_format}")  # type: ignore
+
+    async def get(self, key: str, image_format: str) -> bytes | None:
+        data = self.memory.get(key)
+        if data is not None or not self.directory:
+            return data
+        try:
+            async with aiofiles.open(self.path(key=key, image_format=image_format), mode="rb") as f:
+                data = await f.read()
+        except FileNotFoundError:
+            return None
+        self.disk_hits += 1
+        self.memory.put(key, data)
+        return data
+
+    async def put(self, key: str, encoded: EncodedImage) -> None:
+        data = encoded.data
+        self.memory.put(key, data)
+        if not self.directory:
+            return None
+        path = self.path(key=key, image_format=encoded.format)
+        # Unique per write, concurrent writes of a key from one process must not share a file.
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            await aiofiles.os.makedirs(os.path.dirname(path), exist_ok=True)
+            async with aiofiles.open(temporary_path, mode="wb") as f:
+                await f.write(data)
+            await aiofiles.os.replace(temporary_path, path)
+        except OSError as error:
+            logger.warning(f"Could not write render cache entry {key}: {error!r}")
+            with contextlib.suppress(OSError):
+                await aiofiles.os.remove(temporary_path)
+
+    def stats(self) -> dict[str, int]:
+        return {**self.memory.stats(), "disk_hits": self.disk_hits}
+
+
+class RenderService:
+    """Runs Pillow jobs on a process pool (or a thread pool) away from the event loop.
+
+    At most ``max_pending`` jobs are queued or running at once. Callers wait up to
+    ``queue_timeout`` seconds for a free slot before ``RenderBusyError`` is raised, and each job
+    gets ``job_timeout`` seconds before ``RenderTimeoutError`` is raised. A slot is only freed once
+    its job has really finished, so timed out jobs still count against the queue.
+    """
+
+    def __init__(
+        self,
+        backend: str = "process",
+        workers: int = 2,
+        max_pending: int = 16,
+        queue_timeout: float = 2.0,
+        job_timeout: float = 10.0,
+        base_layers: list[BaseLayerKey] | None = None,
+        output_cache: RenderOutputCache | None = None,
+        wish_profile: str = "default",
+        card_profile: str = "default",
+    ) -> None:
+        self.backend = backend
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.job_timeout = job_timeout
+        self.base_layers = base_layers or []
+        self.output_cache = output_cache
+        self.wish_profile = pillow.get_profile(wish_profile)
+        self.card_profile = pillow.get_profile(card_profile)
+        self.encode_stats: dict[str, dict[str, float]] = {}
+        self.executor: Executor | None = None
+        self.slots = asyncio.Semaphore(max_pending)
+
+    def start(self) -> None:
+        if self.backend == "process":
+            try:
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=init_worker,
+                    initargs=(self.base_layers,),
+                )
+            except (OSError, NotImplementedError, ImportError) as error:
+                logger.warning(f"Process pool unavailable ({error!r}), falling back to a thread pool.")
+                self.backend = "thread"
+        if self.backend == "thread":
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="render",
+                initializer=init_worker,
+                initargs=(self.base_layers,),
+            )
+        logger.info(f"Render service started with {self.workers} {self.backend} worker(s).")
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def restart(self) -> None:
+        logger.warning("Render pool is broken, restarting it.")
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+        self.start()
+
+    def release_slot(self, loop: asyncio.AbstractEventLoop) -> None:
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(self.slots.release)
+
+    async def submit(self, function: t.Callable[..., T], *args: t.Any) -> T:
+        if not self.executor:
+            raise RenderError("Render service is not running.")
+        try:
+            await asyncio.wait_for(self.slots.acquire(), timeout=self.queue_timeout)
+        except TimeoutError:
+            raise RenderBusyError() from None
+
+        loop = asyncio.get_running_loop()
+        try:
+            job: Future = self.executor.submit(function, *args)
+        except BrokenExecutor as error:
+            self.slots.release()
+            self.restart()
+            raise RenderError("Render pool was broken.") from error
+        except BaseException:
+            self.slots.release()
+            raise
+        job.add_done_callback(lambda _: self.release_slot(loop))
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(job)), timeout=self.job_timeout)
+        except TimeoutError:
+            job.cancel()
+            raise RenderTimeoutError() from None
+        except BrokenExecutor as error:
+            self.restart()
+            raise RenderError("Render pool was broken.") from error
+
+    def record_encode(self, profile: EncodeProfile, encoded: EncodedImage) -> None:
+        stats = self.encode_stats.setdefault(profile.name, {"count": 0, "seconds": 0.0, "bytes": 0})
+        stats["count"] += 1
+        stats["seconds"] += encoded.encode_time
+        stats["bytes"] += encoded.size
+        logger.debug(
+            f"Encoded {encoded.size} bytes with the {profile.name!r} profile in {encoded.encode_time * 1000:.1f}ms.",
+        )
+
+    async def render_wish_canvas(self, specs: list[AnicardSpec]) -> EncodedImage:
+        encoded: EncodedImage = await self.submit(render_wish_canvas, specs, self.wish_profile)
+        self.record_encode(profile=self.wish_profile, encoded=encoded)
+        return encoded
+
+    async def render_gallery_page(self, keys: list[BaseLayerKey]) -> EncodedImage:
+        encoded: EncodedImage = await self.submit(render_gallery_page, keys, self.card_profile)
+        self.record_encode(profile=self.card_profile, encoded=encoded)
+        return encoded
+
+    async def render_anicard(self, spec: AnicardSpec) -> EncodedImage:
+        """Encoded image of one Anicard, served from the output cache when it was rendered before."""
+
+        profile = self.card_profile
+        key = self.output_cache.key(spec=spec, profile=profile) if self.output_cache else None
+        if self.output_cache and key:
+            data = await self.output_cache.get(key=key, image_format=profile.format)
+            if data is not None:
+                return pillow.EncodedImage(data=data, format=profile.format)
+        encoded: EncodedImage = await self.submit(render_anicard, spec, profile)
+        self.record_encode(profile=profile, encoded=encoded)
+        if self.output_cache and key:
+            await self.output_cache.put(key=key, encoded=encoded)
+        return encoded
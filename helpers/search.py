@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import struct
+import typing as t
+from array import array
+from collections import Counter
+
+from decouple import config
+
+if t.TYPE_CHECKING:
+    from collections.abc import Mapping
+
+# Minimum similarity of a match, the default ``pg_trgm.similarity_threshold`` of Postgres.
+SIMILARITY_THRESHOLD: float = config("SEARCH_SIMILARITY_THRESHOLD", default=0.3, cast=float)
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+FLOAT4 = struct.Struct("f")
+
+
+class SearchResult(t.NamedTuple):
+    doc_id: int
+    score: float
+
+
+def trigrams(text: str) -> frozenset[str]:
+    """Trigrams of a text the way ``pg_trgm`` extracts them.
+
+    The text is lowercased and split into words of letters and digits, and every word is
+    padded with two spaces in front and one behind, so ``"Levi"`` has the trigrams
+    ``"  l"``, ``" le"``, ``"lev"``, ``"evi"`` and ``"vi "``.
+    """
+
+    return frozenset(
+        padded[start : start + 3]
+        for word in WORD_PATTERN.findall(text.lower())
+        for padded in (f"  {word} ",)
+        for start in range(len(padded) - 2)
+    )
+
+
+def float4(value: float) -> float:
+    return FLOAT4.unpack(FLOAT4.pack(value))[0]
+
+
+def similarity(shared: int, query_size: int, doc_size: int) -> float:
+    """``pg_trgm.similarity`` from trigram counts, rounded to ``real`` as Postgres computes it."""
+
+    union = query_size + doc_size - shared
+    return float4(shared / union) if union > 0 else 0.0
+
+
+def rank(results: list[SearchResult], limit: int | None = None) -> list[SearchResult]:
+    """Best results first, by score and then by id, like ``ORDER BY score DESC, id``."""
+
+    def key(result: SearchResult) -> tuple[float, int]:
+        return -result.score, result.doc_id
+
+    if limit is None:
+        return sorted(results, key=key)
+    return heapq.nsmallest(limit, results, key=key)
+
+
+class TrigramField:
+    """Trigram postings of the distinct values of one field."""
+
+    def __init__(self) -> None:
+        self.value_ids: dict[str, int] = {}
+        # Positions of the documents having each value.
+        self.value_docs: list[array[int]] = []
+        # Number of trigrams of each value.
+        self.value_sizes: array[int] = array("H")
+        # trigram -> ids of the values having it
+        self.postings: dict[str, array[int]] = {}
+
+    def add(self, text: str, position: int) -> None:
+        value_id = self.value_ids.get(text)
+        if value_id is None:
+            value_id = self.value_ids[text] = len(self.value_docs)
+            self.value_docs.append(array("l"))
+            value_trigrams = trigrams(text)
+            self.value_sizes.append(len(value_trigrams))
+            for trigram in value_trigrams:
+                postings = self.postings.get(trigram)
+                if postings is None:
+                    postings = self.postings[trigram] = array("l")
+                postings.append(value_id)
+        self.value_docs[value_id].append(position)
+
+    def shared_trigrams(self, query_trigrams: frozenset[str], min_shared: int) -> list[tuple[int, int]]:
+        """``(value id, shared trigrams)`` of the values sharing at least ``min_shared`` trigrams."""
+
+        counts: Counter[int] = Counter()
+        for trigram in query_trigrams:
+            postings = self.postings.get(trigram)
+            if postings:
+                counts.update(postings)
+        return [(value_id, shared) for value_id, shared in counts.items() if shared >= min_shared]
+
+
+class TrigramIndex:
+    """In-memory trigram index over a few text fields of documents, matching ``pg_trgm``.
+
+    A document matches a query when the ``pg_trgm`` similarity of the query to any of its
+    fields reaches the threshold, and scores the best of these similarities, so results are
+    the same as ``WHERE a % $1 OR b % $1 ORDER BY GREATEST(similarity(a, $1), similarity(b,
+    $1)) DESC, id`` on Postgres.
+
+    Each field indexes its distinct values, as many documents share an anime. A query counts
+    the trigrams it shares with every value through the postings of its own trigrams, and only
+    computes the similarity of the values sharing enough of them to possibly reach the
+    threshold.
+    """
+
+    def __init__(self, fields: tuple[str, ...]) -> None:
+        self.fields = {field: TrigramField() for field in fields}
+        self.doc_ids: array[int] = array("q")
+        self.positions: dict[int, int] = {}
+
+    @property
+    def doc_count(self) -> int:
+        return len(self.doc_ids)
+
+    def add(self, doc_id: int, texts: Mapping[str, str | None]) -> None:
+        """Index a document, documents already indexed are left as they are."""
+
+        if doc_id in self.positions:
+            return None
+        position = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.positions[doc_id] = position
+        for field, trigram_field in self.fields.items():
+            trigram_field.add(text=texts.get(field) or "", position=position)
+
+    def search(
+        self,
+        query: str,
+        limit: int | None = None,
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> list[SearchResult]:
+        """Documents matching ``query``, best first, at most ``limit`` of them."""
+
+        query_trigrams = trigrams(query)
+        query_size = len(query_trigrams)
+        if not query_size:
+            return []
+        # The similarity is at most shared / query_size.
+        min_shared = max(1, math.ceil(threshold * query_size - 1e-6))
+
+        # Document position -> best similarity of its fields.
+        scores: dict[int, float] = {}
+        for trigram_field in self.fields.values():
+            value_sizes = trigram_field.value_sizes
+            for value_id, shared in trigram_field.shared_trigrams(query_trigrams, min_shared=min_shared):
+                score = similarity(shared=shared, query_size=query_size, doc_size=value_sizes[value_id])
+                if score < threshold:
+                    continue
+                for position in trigram_field.value_docs[value_id]:
+                    if score > scores.get(position, -1.0):
+                        scores[position] = score
+
+        doc_ids = self.doc_ids
+        results = [SearchResult(doc_id=doc_ids[position], score=score) for position, score in scores.items()]
+        return rank(results=results, limit=limit)
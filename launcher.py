@@ -1,12 +1,23 @@
 import typing as t
 from pkgutil import iter_modules
 
-import asyncpg
 import discord
 from decouple import config
 from discord.ext import commands
 from loguru import logger
 
+import helpers.fonts as fonts
+from helpers.cooldown import CooldownStore
+from helpers.custom_check import RegisteredUserCache
+from helpers.database import DatabasePool
+from helpers.render import RenderOutputCache, RenderService
+from models.anicard import fetch_popular_base_layers
+from models.collection import CollectionIndexCache
+from models.minion import CodexAllocator, MinionCatalog, MinionSearch
+from views.confirm_view import ConfirmButton
+from views.pagination_view import PageButton
+from views.wish_view import WishClaimButton
+
 
 class Uwuily(commands.AutoShardedBot):
     def __init__(self, command_prefix: list[str], **kwargs: t.Any) -> None:
@@ -15,10 +26,66 @@ class Uwuily(commands.AutoShardedBot):
             strip_after_prefix=True,
             **kwargs,
         )
-        self.db: asyncpg.Pool
+        self.db: DatabasePool
+        self.cooldown_store: CooldownStore | None = None
+        self.render: RenderService | None = None
+        self.registered_users = RegisteredUserCache()
+        search_backend = config("SEARCH_BACKEND", default="memory")
+        self.minion_catalog = MinionCatalog(
+            refresh_interval=config("MINION_CATALOG_REFRESH_INTERVAL", default=300.0, cast=float),
+            search_index=search_backend == "memory",
+        )
+        self.minion_search = MinionSearch(catalog=self.minion_catalog, backend=search_backend)
+        self.codex_allocator = CodexAllocator(block_size=config("CODEX_BLOCK_SIZE", default=16, cast=int))
+        self.collection_indexes = CollectionIndexCache(
+            max_bytes=config("COLLECTION_INDEX_MAX_BYTES", default=128 * 1024 * 1024, cast=int),
+            max_user_cards=config("COLLECTION_INDEX_USER_MAX_CARDS", default=5000, cast=int),
+            ttl=config("COLLECTION_INDEX_TTL", default=600.0, cast=float),
+        )
 
     async def setup_db(self) -> None:
-        self.db = await asyncpg.create_pool(config("DB_URI"))  # type: ignore
+        self.db = await DatabasePool.create(
+            dsn=str(config("DB_URI")),
+            min_size=config("DB_POOL_MIN_SIZE", default=10, cast=int),
+            max_size=config("DB_POOL_MAX_SIZE", default=10, cast=int),
+            max_queries=config("DB_POOL_MAX_QUERIES", default=50000, cast=int),
+            max_inactive_connection_lifetime=config("DB_POOL_MAX_INACTIVE_LIFETIME", default=300.0, cast=float),
+            statement_cache_size=config("DB_STATEMENT_CACHE_SIZE", default=100, cast=int),
+            command_timeout=config("DB_COMMAND_TIMEOUT", default=0.0, cast=float) or None,
+            adaptive=config("DB_POOL_ADAPTIVE", default=False, cast=bool),
+            target_wait=config("DB_POOL_TARGET_WAIT", default=0.01, cast=float),
+        )
+        await self.registered_users.warm(db=self.db)
+        await self.minion_catalog.load(db=self.db)
+        self.cooldown_store = CooldownStore(
+            db=self.db,
+            flush_interval=config("COOLDOWN_FLUSH_INTERVAL", default=5.0, cast=float),
+            ttl=config("COOLDOWN_TTL", default=3600.0, cast=float),
+            write_through=config("COOLDOWN_WRITE_THROUGH", default=False, cast=bool),
+        )
+        self.cooldown_store.start()
+
+    async def setup_render(self) -> None:
+        fonts.registry.warm()
+        base_layers = await fetch_popular_base_layers(
+            db=self.db,
+            limit=config("BASE_LAYER_WARM_LIMIT", default=64, cast=int),
+        )
+        self.render = RenderService(
+            backend=config("RENDER_BACKEND", default="process"),
+            workers=config("RENDER_WORKERS", default=2, cast=int),
+            max_pending=config("RENDER_MAX_PENDING", default=16, cast=int),
+            queue_timeout=config("RENDER_QUEUE_TIMEOUT", default=2.0, cast=float),
+            job_timeout=config("RENDER_JOB_TIMEOUT", default=10.0, cast=float),
+            base_layers=base_layers,
+            output_cache=RenderOutputCache(
+                max_bytes=config("RENDER_CACHE_MAX_BYTES", default=64 * 1024 * 1024, cast=int),
+                directory=config("RENDER_CACHE_DIR", default=None),
+            ),
+            wish_profile=config("RENDER_WISH_PROFILE", default="default"),
+            card_profile=config("RENDER_CARD_PROFILE", default="default"),
+        )
+        self.render.start()
 
     async def load_cogs(self) -> None:
         cog_extensions = [module.name for module in iter_modules(["cogs"])]
@@ -28,12 +95,19 @@ class Uwuily(commands.AutoShardedBot):
 
     async def setup_hook(self) -> None:
         await self.setup_db()
+        await self.setup_render()
         await self.load_cogs()
+        # Persistent buttons are dispatched from their custom id, also on messages sent before a restart.
+        self.add_dynamic_items(WishClaimButton, PageButton, ConfirmButton)
         message = f"{self.user} has connected to Discord!"
         logger.info(message)
 
     async def close(self) -> None:
         await super().close()
+        if self.render:
+            self.render.close()
+        if self.cooldown_store:
+            await self.cooldown_store.close()
         if self.db:
             await self.db.close()
 
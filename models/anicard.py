@@ -1,19 +1,48 @@
 from __future__ import annotations
 
+import asyncio
 import typing as t
-from dataclasses import dataclass, field
+from dataclasses import dataclass, fields
 
-from PIL import Image, ImageDraw, ImageFont
+from decouple import config
 
+import helpers.fonts as fonts
+import helpers.label as label
 import helpers.pillow as pillow
+from helpers.cache import LRUCache
+from helpers.query import Query
 
 if t.TYPE_CHECKING:
+    from collections.abc import Mapping, Sequence
     from datetime import datetime
 
+    import asyncpg
+    from PIL import Image
 
-@dataclass
+# (character, image_ver, frame, is_shattered)
+BaseLayerKey = tuple[str | None, int | None, str | None, bool]
+
+base_layer_cache: LRUCache[BaseLayerKey, Image.Image] = LRUCache(
+    max_bytes=config("BASE_LAYER_CACHE_MAX_BYTES", default=128 * 1024 * 1024, cast=int),
+    sizeof=pillow.image_size,
+)
+
+# Thumbnails are base layers reduced by this factor in each dimension.
+THUMBNAIL_SCALE = 3
+
+thumbnail_cache: LRUCache[BaseLayerKey, Image.Image] = LRUCache(
+    max_bytes=config("THUMBNAIL_CACHE_MAX_BYTES", default=32 * 1024 * 1024, cast=int),
+    sizeof=pillow.image_size,
+)
+
+
+@dataclass(slots=True)
 class Anicard:
-    """Anicard model."""
+    """Anicard model.
+
+    Slotted, as collections load thousands of them. ``inventory`` stays ``None`` until the
+    Anicard has one.
+    """
 
     anicard_id: int | None = None
     user_id: int | None = None
@@ -38,106 +67,133 @@ class Anicard:
     original_aniclass: str | None = None
     current_codex: int | None = None
     ability: str | None = None
-    inventory: list = field(default_factory=list)
+    inventory: list | None = None
+
+    @classmethod
+    def from_record(cls, record: Mapping[str, t.Any]) -> Anicard:
+        """Build an Anicard straight from a record whose columns are named after its fields."""
+
+        return cls(**record)
+
+    @classmethod
+    def from_row(cls, columns: Sequence[str], row: Sequence[t.Any]) -> Anicard:
+        """Build an Anicard from the values of an anonymous row and the fields they belong to."""
+
+        if tuple(columns) == ANICARD_FIELDS[: len(columns)]:
+            return cls(*row)
+        return cls(**dict(zip(columns, row, strict=True)))
+
+    def to_spec(self) -> AnicardSpec:
+        return AnicardSpec(
+            character=self.character,
+            anime=self.anime,
+            tag=self.tag,
+            image_ver=self.image_ver,
+            frame=self.frame,
+            is_shattered=self.is_shattered,
+            aniclass=self.aniclass,
+            codex=self.codex,
+        )
 
     async def draw_anicard(self) -> Image.Image:
-        def write_text_on_anicard(
-            anicard_draw: ImageDraw.ImageDraw,
-            text: str,
-            position: tuple[int, int],
-            font: ImageFont.FreeTypeFont,
-            fill: tuple[int, int, int],
-            stroke_width: int,
-            stroke_fill: str,
-        ) -> None:
-            width, _ = font.getsize(text)  # type: ignore
-            pos_x, pos_y = position
-            text_position = (pos_x - width // 2, pos_y)
-            anicard_draw.text(
-                text_position,
-                text,
-                font=font,
-                fill=fill,
-                stroke_width=stroke_width,
-                stroke_fill=stroke_fill,
-            )
+        """Draw the Anicard on a worker thread so the event loop is not blocked."""
+
+        return await asyncio.to_thread(self.to_spec().draw)
 
-        anicard_path = f"assets/anicard/character/{self.character}_v{self.image_ver}.png"
-        anicard_image: Image.Image = await pillow.get_image(image_path=anicard_path)
 
-        if self.is_shattered:
-            shattered_path = "assets/anicard/shattered.png"
-            shattered_image: Image.Image = await pillow.get_image(image_path=shattered_path)
-            anicard_image.paste(shattered_image, mask=shattered_image)
+ANICARD_FIELDS = tuple(field.name for field in fields(Anicard))
 
-        frame_path = f"assets/anicard/frame/{self.frame}.png"
-        frame_image: Image.Image = await pillow.get_image(image_path=frame_path)
-        anicard_image.paste(frame_image, mask=frame_image)
 
-        anicard_draw = ImageDraw.Draw(anicard_image)
+@dataclass(frozen=True)
+class AnicardSpec:
+    """Picklable subset of an Anicard holding every field its image depends on."""
+
+    character: str | None = None
+    anime: str | None = None
+    tag: str | None = None
+    image_ver: int | None = None
+    frame: str | None = None
+    is_shattered: bool | None = None
+    aniclass: str | None = None
+    codex: int | None = None
+
+    @property
+    def base_layer_key(self) -> BaseLayerKey:
+        return (self.character, self.image_ver, self.frame, bool(self.is_shattered))
+
+    def draw(self) -> Image.Image:
+        anicard_image: Image.Image = get_base_layer(key=self.base_layer_key).copy()
+        self.draw_text(anicard_image=anicard_image)
+        return anicard_image
 
+    def draw_text(self, anicard_image: Image.Image) -> None:
         if self.character:
             minion_name_pos = (226, 495)
-            minion_name_font = ImageFont.truetype("assets/font/Insanibc.TTF", 55)
+            minion_name_font = fonts.registry.get(fonts.INSANIBC, 55)
             minion_name_color = (255, 255, 255)
             minion_name_stroke_width = 5
             minion_name_stroke_color = "black"
-            write_text_on_anicard(
-                anicard_draw=anicard_draw,
+            label.draw_label(
+                image=anicard_image,
                 text=self.character,
                 position=minion_name_pos,
                 font=minion_name_font,
                 fill=minion_name_color,
                 stroke_width=minion_name_stroke_width,
                 stroke_fill=minion_name_stroke_color,
+                centered=True,
             )
 
         if self.anime:
             anime_name_pos = (226, 555)
-            anime_name_font = ImageFont.truetype("assets/font/Insanibc.TTF", 35)
+            anime_name_font = fonts.registry.get(fonts.INSANIBC, 35)
             anime_name_color = (255, 255, 102)
             anime_name_stroke_width = 5
             anime_name_stroke_color = "black"
-            write_text_on_anicard(
-                anicard_draw=anicard_draw,
+            label.draw_label(
+                image=anicard_image,
                 text=self.anime,
                 position=anime_name_pos,
                 font=anime_name_font,
                 fill=anime_name_color,
                 stroke_width=anime_name_stroke_width,
                 stroke_fill=anime_name_stroke_color,
+                centered=True,
             )
 
         if self.tag:
             tag_pos = (226, 622)
-            tag_font = ImageFont.truetype("assets/font/Insanibc.TTF", 35)
+            tag_font = fonts.registry.get(fonts.INSANIBC, 35)
             tag_color = (255, 255, 255)
             tag_stroke_width = 2
             tag_stroke_color = "black"
-            write_text_on_anicard(
-                anicard_draw=anicard_draw,
+            label.draw_label(
+                image=anicard_image,
                 text=self.tag,
                 position=tag_pos,
                 font=tag_font,
                 fill=tag_color,
                 stroke_width=tag_stroke_width,
                 stroke_fill=tag_stroke_color,
+                centered=True,
+                cache=False,
             )
 
         if self.aniclass and self.codex:
-            aniclass_font = ImageFont.truetype("assets/font/Emoji.TTF", 25)
-            codex_font = ImageFont.truetype("assets/font/Insanibc.TTF", 25)
+            aniclass_font = fonts.registry.get(fonts.EMOJI, 25)
+            codex_font = fonts.registry.get(fonts.INSANIBC, 25)
             left, top, right, bottom = codex_font.getbbox(str(self.codex))
             width, _ = right - left, bottom - top
             aniclass_text_position = (452 - width) / 2 - 20, 25
             aniclass_text_color = (255, 255, 255)
             aniclass_stroke_width = 3
             aniclass_stroke_fill = "black"
-            anicard_draw.text(
-                aniclass_text_position,
-                self.aniclass,
-                aniclass_text_color,
+            label.draw_label(
+                image=anicard_image,
+                text=self.aniclass,
+                position=aniclass_text_position,
                 font=aniclass_font,
+                fill=aniclass_text_color,
                 stroke_width=aniclass_stroke_width,
                 stroke_fill=aniclass_stroke_fill,
             )
@@ -145,13 +201,97 @@ class Anicard:
             codex_text_color = (255, 255, 255)
             codex_stroke_width = 2
             codex_stroke_fill = "black"
-            anicard_draw.text(
-                codex_text_position,
-                str(self.codex),
-                codex_text_color,
+            label.draw_label(
+                image=anicard_image,
+                text=str(self.codex),
+                position=codex_text_position,
                 font=codex_font,
+                fill=codex_text_color,
                 stroke_width=codex_stroke_width,
                 stroke_fill=codex_stroke_fill,
+                cache=False,
             )
 
-        return anicard_image
+
+CHARACTER_PATH = "assets/anicard/character/{character}_v{image_ver}.png"
+SHATTERED_PATH = "assets/anicard/shattered.png"
+FRAME_PATH = "assets/anicard/frame/{frame}.png"
+
+
+def base_layer_paths(key: BaseLayerKey) -> list[str]:
+    """Asset paths a base layer is composited from, bottom layer first."""
+
+    character, image_ver, frame, is_shattered = key
+    paths = [CHARACTER_PATH.format(character=character, image_ver=image_ver)]
+    if is_shattered:
+        paths.append(SHATTERED_PATH)
+    paths.append(FRAME_PATH.format(frame=frame))
+    return paths
+
+
+def compose_base_layer(key: BaseLayerKey) -> Image.Image:
+    """Composite the character art, shattered overlay and frame of an Anicard, without any text."""
+
+    character, image_ver, frame, is_shattered = key
+    anicard_path = CHARACTER_PATH.format(character=character, image_ver=image_ver)
+    anicard_image: Image.Image = pillow.get_image(image_path=anicard_path)
+
+    if is_shattered:
+        shattered_image: Image.Image = pillow.get_layer(image_path=SHATTERED_PATH)
+        anicard_image.paste(shattered_image, mask=shattered_image)
+
+    frame_path = FRAME_PATH.format(frame=frame)
+    frame_image: Image.Image = pillow.get_layer(image_path=frame_path)
+    anicard_image.paste(frame_image, mask=frame_image)
+
+    return anicard_image
+
+
+def get_base_layer(key: BaseLayerKey) -> Image.Image:
+    """Get a shared, cached base layer. It must be copied before it is drawn on."""
+
+    base_layer = base_layer_cache.get(key)
+    if base_layer is None:
+        base_layer = compose_base_layer(key=key)
+        base_layer_cache.put(key, base_layer)
+    return base_layer
+
+
+def get_thumbnail_layer(key: BaseLayerKey) -> Image.Image:
+    """Get a shared, cached thumbnail resolution base layer. It must only be read."""
+
+    thumbnail = thumbnail_cache.get(key)
+    if thumbnail is None:
+        thumbnail = get_base_layer(key=key).reduce(THUMBNAIL_SCALE)
+        thumbnail_cache.put(key, thumbnail)
+    return thumbnail
+
+
+def warm_base_layers(keys: list[BaseLayerKey]) -> None:
+    for key in keys:
+        try:
+            get_base_layer(key=key)
+        except OSError:
+            continue
+
+
+FETCH_POPULAR_BASE_LAYERS = Query(
+    name="user_anicards.popular_base_layers",
+    sql="""
+        SELECT minions.character, user_anicards.image_ver, user_anicards.frame, user_anicards.is_shattered
+        FROM user_anicards
+        JOIN minions ON user_anicards.minion_id = minions.minion_id
+        GROUP BY minions.character, user_anicards.image_ver, user_anicards.frame, user_anicards.is_shattered
+        ORDER BY COUNT(*) DESC
+        LIMIT $1;
+    """,
+)
+
+
+async def fetch_popular_base_layers(db: asyncpg.Pool, limit: int) -> list[BaseLayerKey]:
+    """Most owned (character, image_ver, frame, is_shattered) combinations, used to warm the cache."""
+
+    query: list[asyncpg.Record] = await FETCH_POPULAR_BASE_LAYERS.fetch(db, limit)
+    return [
+        (record["character"], record["image_ver"], record["frame"], bool(record["is_shattered"])) for record in query
+    ]
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import asyncio
+import bisect
+import heapq
+import random
+import time
+import typing as t
+from array import array
+
+import asyncpg
+from loguru import logger
+
+from helpers.query import Query
+from helpers.search import SIMILARITY_THRESHOLD, SearchResult, TrigramIndex
+
+if t.TYPE_CHECKING:
+    from collections.abc import Mapping
+
+FETCH_MINIONS = Query(
+    name="minions.fetch",
+    sql="""
+        SELECT minion_id, character, anime, original_aniclass
+        FROM minions
+        WHERE minion_id > $1
+        ORDER BY minion_id;
+    """,
+)
+# Bumped by a trigger on every change of the columns the catalog holds, see ``tools.migrate``.
+FETCH_MINIONS_VERSION = Query(
+    name="minions.version",
+    sql="""
+        SELECT version
+        FROM minions_version;
+    """,
+)
+# ``%`` compares with this setting, set for the current transaction only.
+SET_SIMILARITY_THRESHOLD = Query(
+    name="minions.set_similarity_threshold",
+    sql="SELECT set_config('pg_trgm.similarity_threshold', $1, true);",
+)
+SEARCH_MINIONS = Query(
+    name="minions.search",
+    sql="""
+        SELECT minion_id, GREATEST(similarity(character, $1), similarity(anime, $1)) AS score
+        FROM minions
+        WHERE character % $1 OR anime % $1
+        ORDER BY score DESC, minion_id
+        LIMIT $2;
+    """,
+)
+RESERVE_CODEXES = Query(
+    name="minions.reserve_codexes",
+    sql="""
+        UPDATE minions
+        SET current_codex = current_codex + $2
+        WHERE minion_id = ANY($1)
+        RETURNING minion_id, current_codex
+    """,
+)
+
+
+class MissingMigrationError(RuntimeError):
+    """The database lacks schema the bot relies on, which ``tools.migrate`` creates."""
+
+
+class Minion(t.NamedTuple):
+    minion_id: int
+    character: str
+    anime: str
+    original_aniclass: str
+
+
+class MinionCatalog:
+    """In-memory copy of the ``minions`` table for drawing wishes without a database scan.
+
+    Minions are stored column-wise, ids and weights in ``array``s, and drawn with Vose's alias
+    method: one uniform index and one coin flip per draw whatever the size of the catalog.
+    Every minion has weight 1 unless ``set_weights`` says otherwise.
+
+    ``refresh`` reloads the catalog when the version of ``minions_version`` moved since the last
+    load, so added, edited and removed minions are all picked up. With ``search_index``,
+    characters and animes are also kept in a trigram index for ``MinionSearch``.
+    """
+
+    def __init__(self, refresh_interval: float = 300.0, search_index: bool = True) -> None:
+        self.refresh_interval = refresh_interval
+        self.search_index = TrigramIndex(fields=("character", "anime")) if search_index else None
+        self.minion_ids: array[int] = array("q")
+        self.characters: list[str] = []
+        self.animes: list[str] = []
+        self.aniclasses: list[str] = []
+        self.weights: array[float] = array("d")
+        self.custom_weights: dict[int, float] = {}
+        self.alias_probability: array[float] = array("d")
+        self.alias_index: array[int] = array("l")
+        self.drawable_count = 0
+        self.version: int | None = None
+        self.refreshed_at = 0.0
+        self.refresh_task: asyncio.Task[None] | None = None
+
+    def replace(self, catalog: MinionCatalog) -> None:
+        """Take the minions of ``catalog``, which was built away from the event loop."""
+
+        self.minion_ids = catalog.minion_ids
+        self.characters = catalog.characters
+        self.animes = catalog.animes
+        self.aniclasses = catalog.aniclasses
+        self.search_index = catalog.search_index
+        self.weights = catalog.weights
+        self.alias_probability = catalog.alias_probability
+        self.alias_index = catalog.alias_index
+        self.drawable_count = catalog.drawable_count
+        # The weights changed while the catalog was built.
+        if catalog.custom_weights is not self.custom_weights:
+            self.set_weights(self.custom_weights)
+
+    def append(self, records: list[asyncpg.Record]) -> None:
+        for record in records:
+            self.minion_ids.append(record["minion_id"])
+            self.characters.append(record["character"])
+            self.animes.append(record["anime"])
+            self.aniclasses.append(record["original_aniclass"])
+            self.weights.append(self.custom_weights.get(record["minion_id"], 1.0))
+            if self.search_index:
+                self.search_index.add(record["minion_id"], {"character": record["character"], "anime": record["anime"]})
+        self.build_alias_table()
+
+    def set_weights(self, weights: Mapping[int, float]) -> None:
+        """Set the relative rarity of minions by id, minions not given keep weight 1."""
+
+        self.custom_weights = dict(weights)
+        self.weights = array("d", (self.custom_weights.get(minion_id, 1.0) for minion_id in self.minion_ids))
+        self.build_alias_table()
+
+    def build_alias_table(self) -> None:
+        count = len(self.weights)
+        total = sum(self.weights)
+        self.alias_probability = array("d", [1.0]) * count
+        self.alias_index = array("l", range(count))
+        self.drawable_count = sum(1 for weight in self.weights if weight > 0)
+        if not count or total <= 0:
+            return
+        scaled = [weight * count / total for weight in self.weights]
+        small = [index for index, weight in enumerate(scaled) if weight < 1.0]
+        large = [index for index, weight in enumerate(scaled) if weight >= 1.0]
+        while small and large:
+            small_index, large_index = small.pop(), large.pop()
+            self.alias_probability[small_index] = scaled[small_index]
+            self.alias_index[small_index] = large_index
+            scaled[large_index] -= 1.0 - scaled[small_index]
+            (small if scaled[large_index] < 1.0 else large).append(large_index)
+
+    def draw_index(self) -> int:
+        index = random.randrange(len(self.alias_probability))
+        return index if random.random() < self.alias_probability[index] else self.alias_index[index]
+
+    def get(self, index: int) -> Minion:
+        return Minion(
+            minion_id=self.minion_ids[index],
+            character=self.characters[index],
+            anime=self.animes[index],
+            original_aniclass=self.aniclasses[index],
+        )
+
+    def find(self, minion_id: int) -> Minion | None:
+        # Minions are loaded and appended in ascending id order.
+        index = bisect.bisect_left(self.minion_ids, minion_id)
+        if index < len(self.minion_ids) and self.minion_ids[index] == minion_id:
+            return self.get(index)
+        return None
+
+    def sample(self, amount: int) -> list[Minion]:
+        """Draw ``amount`` distinct minions, weighted by rarity."""
+
+        if amount >= self.drawable_count:
+            indexes = [index for index, weight in enumerate(self.weights) if weight > 0]
+            random.shuffle(indexes)
+            return [self.get(index) for index in indexes]
+        indexes: list[int] = []
+        while len(indexes) < amount:
+            index = self.draw_index()
+            if index not in indexes:
+                indexes.append(index)
+        return [self.get(index) for index in indexes]
+
+    async def load(self, db: asyncpg.Pool) -> None:
+        async with db.acquire() as connection:
+            # Read before the minions, a change committed in between is picked up by the next refresh.
+            try:
+                version: int = await FETCH_MINIONS_VERSION.fetchval(connection)
+            except asyncpg.UndefinedTableError:
+                raise MissingMigrationError(
+                    "The minions_version table does not exist, run `python -m tools.migrate` first.",
+                ) from None
+            records = await FETCH_MINIONS.fetch(connection, 0)
+        # Indexing 100k minions takes seconds, which would stall the bot on the event loop.
+        catalog = MinionCatalog(refresh_interval=self.refresh_interval, search_index=self.search_index is not None)
+        catalog.custom_weights = self.custom_weights
+        await asyncio.to_thread(catalog.append, records=records)
+        self.replace(catalog=catalog)
+        self.version = version
+        self.refreshed_at = time.monotonic()
+        logger.info(f"Minion catalog loaded with {len(self.minion_ids)} minion(s) at version {version}.")
+
+    async def refresh(self, db: asyncpg.Pool) -> None:
+        version: int = await FETCH_MINIONS_VERSION.fetchval(db)
+        if version != self.version:
+            await self.load(db=db)
+            return
+        self.refreshed_at = time.monotonic()
+
+    async def refresh_logged(self, db: asyncpg.Pool) -> None:
+        try:
+            await self.refresh(db=db)
+        except Exception:
+            logger.exception("Could not refresh the minion catalog, retrying later.")
+
+    def refresh_if_stale(self, db: asyncpg.Pool) -> None:
+        """Refresh in the background when the catalog is older than ``refresh_interval``.
+
+        Callers keep using the catalog as it is until the refresh is done, so a draw or a search
+        never waits for the database.
+        """
+
+        if self.refresh_task and not self.refresh_task.done():
+            return
+        if time.monotonic() - self.refreshed_at >= self.refresh_interval:
+            self.refresh_task = asyncio.create_task(self.refresh_logged(db=db))
+
+
+class MinionSearch:
+    """Fuzzy search of minions by character and anime.
+
+    The ``memory`` backend searches the trigram index of the minion catalog, the ``postgres``
+    backend asks ``pg_trgm`` through its GIN indexes. Both match and score with the
+    ``pg_trgm`` similarity against the same threshold and break ties by minion id, so they
+    return the same minions in the same order.
+    """
+
+    BACKENDS = ("memory", "postgres")
+    # From this many minions a memory search takes milliseconds, so it runs in a worker thread
+    # and the event loop gets to run in between.
+    THREAD_MIN_MINIONS = 20000
+
+    def __init__(
+        self,
+        catalog: MinionCatalog,
+        backend: str = "memory",
+        threshold: float = SIMILARITY_THRESHOLD,
+    ) -> None:
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Unknown search backend {backend!r}, expected one of {', '.join(self.BACKENDS)}.")
+        self.catalog = catalog
+        self.backend = backend
+        self.threshold = threshold
+
+    async def search(self, db: asyncpg.Pool, query: str, limit: int | None = None) -> list[SearchResult]:
+        """Minions whose character or anime is similar to ``query``, best first."""
+
+        if self.backend == "memory":
+            self.catalog.refresh_if_stale(db=db)
+            search_index: TrigramIndex = self.catalog.search_index  # type: ignore
+            if search_index.doc_count < self.THREAD_MIN_MINIONS:
+                return search_index.search(query, limit=limit, threshold=self.threshold)
+            return await asyncio.to_thread(search_index.search, query, limit=limit, threshold=self.threshold)
+
+        async with db.acquire() as connection, connection.transaction():
+            await SET_SIMILARITY_THRESHOLD.fetchval(connection, str(self.threshold))
+            records: list[asyncpg.Record] = await SEARCH_MINIONS.fetch(connection, query, limit)
+        return [SearchResult(doc_id=record["minion_id"], score=record["score"]) for record in records]
+
+
+class CodexAllocator:
+    """Hands out codex numbers from blocks reserved in ``minions.current_codex``.
+
+    Instead of incrementing ``current_codex`` on every wish, a process bumps it by a whole block
+    at once and hands the numbers out from memory, so concurrent wishes rarely touch the hot
+    minion rows. A reserved number is never reserved again, which keeps codexes unique across
+    processes and restarts; numbers left in a block when the process stops are skipped.
+
+    Codexes of wished Anicards that were never claimed are released and handed out first.
+    """
+
+    def __init__(self, block_size: int = 16) -> None:
+        self.block_size = block_size
+        # minion_id -> [next codex, end of the reserved block (exclusive)]
+        self.blocks: dict[int, list[int]] = {}
+        # minion_id -> heap of released codexes
+        self.released: dict[int, list[int]] = {}
+
+    def available(self, minion_id: int) -> int:
+        next_codex, block_end = self.blocks.get(minion_id, (0, 0))
+        return len(self.released.get(minion_id, ())) + block_end - next_codex
+
+    def take(self, minion_id: int) -> int:
+        released = self.released.get(minion_id)
+        if released:
+            return heapq.heappop(released)
+        block = self.blocks[minion_id]
+        block[0] += 1
+        return block[0] - 1
+
+    async def reserve(self, db: asyncpg.Pool, minion_ids: list[int], size: int) -> None:
+        records = await RESERVE_CODEXES.fetch(db, minion_ids, size)
+        for record in records:
+            block_end = record["current_codex"] + 1
+            self.blocks[record["minion_id"]] = [block_end - size, block_end]
+
+    async def allocate(self, db: asyncpg.Pool, minion_ids: list[int]) -> dict[int, int]:
+        """Allocate one codex per minion, reserving new blocks in a single query when needed.
+
+        Minions that no longer exist are left out of the result.
+        """
+
+        exhausted = [minion_id for minion_id in minion_ids if not self.available(minion_id)]
+        if exhausted:
+            await self.reserve(db=db, minion_ids=exhausted, size=self.block_size)
+        return {minion_id: self.take(minion_id) for minion_id in minion_ids if self.available(minion_id)}
+
+    def release(self, minion_id: int, codex: int) -> None:
+        """Give back the codex of an Anicard that was never added to a collection.
+
+        Codexes the allocator still holds, released already or not handed out yet, are ignored,
+        so a codex given back twice is not handed out twice.
+        """
+
+        released = self.released.setdefault(minion_id, [])
+        next_codex, block_end = self.blocks.get(minion_id, (0, 0))
+        if codex in released or next_codex <= codex < block_end:
+            return
+        heapq.heappush(released, codex)
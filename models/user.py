@@ -1,13 +1,101 @@
+from __future__ import annotations
+
 import typing as t
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
-from discord.ext import commands
-
+from helpers.query import Query
 from models.anicard import Anicard
 
 if t.TYPE_CHECKING:
+    from collections.abc import Sequence
+
     import asyncpg
+    from discord.ext import commands
+
+    from launcher import Uwuily
+
+COOLDOWN_COLUMNS = ("membership_expire_ts", "last_wish_ts", "last_weeble_ts")
+CONFIG_COLUMNS = ("max_minion",)
+
+# Anicard field -> the column it is loaded from.
+ANICARD_COLUMNS = {
+    "anicard_id": "user_anicards.anicard_id",
+    "user_id": "user_anicards.user_id",
+    "minion_id": "user_anicards.minion_id",
+    "tag": "user_anicards.tag",
+    "image_ver": "user_anicards.image_ver",
+    "frame": "user_anicards.frame",
+    "obtained_ts": "user_anicards.obtained_ts",
+    "is_shattered": "user_anicards.is_shattered",
+    "tier": "user_anicards.tier",
+    "aniclass": "user_anicards.aniclass",
+    "codex": "user_anicards.codex",
+    "xp": "user_anicards.xp",
+    "spiritfuse_total": "user_anicards.spiritfuse_total",
+    "is_summoned": "user_anicards.is_summoned",
+    "hitpoint": "user_anicards.hitpoint",
+    "location": "user_anicards.location",
+    "activity": "user_anicards.activity",
+    "activity_start_ts": "user_anicards.activity_start_ts",
+    "character": "minions.character",
+    "anime": "minions.anime",
+    "original_aniclass": "minions.original_aniclass",
+    "current_codex": "minions.current_codex",
+    "ability": "minions.ability",
+}
+
+# Locks the user's config row, so summons and wish claims of the same user run one after the other.
+LOCK_USER_CONFIGS = Query(
+    name="user_configs.lock",
+    sql="""
+        SELECT 1
+        FROM user_configs
+        WHERE user_id = $1
+        FOR UPDATE;
+    """,
+)
+
+DEFAULT_SKILLS = ("Agility", "Cooking", "Fishing")
+# New users start with their cooldowns already expired.
+NEW_USER_COOLDOWN_AGE = timedelta(days=30)
+
+# Registers every given user id that is not registered yet, in one statement.
+REGISTER_USERS = Query(
+    name="users.register",
+    sql="""
+        WITH new_users AS (
+            INSERT INTO users (user_id)
+            SELECT DISTINCT unnest($1::bigint[])
+            ON CONFLICT DO NOTHING
+            RETURNING user_id
+        ), new_configs AS (
+            INSERT INTO user_configs (user_id)
+            SELECT user_id FROM new_users
+            ON CONFLICT DO NOTHING
+        ), new_stats AS (
+            INSERT INTO user_stats (user_id)
+            SELECT user_id FROM new_users
+            ON CONFLICT DO NOTHING
+        ), new_skills AS (
+            INSERT INTO user_skills (user_id, skill_name, skill_level, skill_xp)
+            SELECT new_users.user_id, skill_name, 1, 0
+            FROM new_users
+            CROSS JOIN unnest($2::text[]) AS skill_name
+        )
+        INSERT INTO user_cooldowns (user_id, membership_expire_ts, last_wish_ts, last_weeble_ts)
+        SELECT user_id, $3, $3, $3 FROM new_users;
+    """,
+)
+# Built per call from the requested aspects and columns.
+FETCH_USER_DATA = Query(name="users.fetch_data")
+
+
+def select_columns(table: str, columns: Sequence[str]) -> str:
+    for column in columns:
+        if not column.isidentifier():
+            raise ValueError(f"Invalid column name {column!r}.")
+    return ", ".join(f"{table}.{column}" for column in columns)
 
 
 @dataclass
@@ -18,51 +106,10 @@ class User:
     anicards: list = field(default_factory=list)
     minions: list = field(default_factory=list)
 
-    async def register(self, ctx: commands.Context) -> None:
-        fake_datetime = datetime.utcnow() - timedelta(days=30)
-        async with ctx.bot.db.acquire() as connection, connection.transaction():
-            await connection.execute(
-                """
-                    INSERT INTO users (user_id)
-                    VALUES ($1)
-                    ON CONFLICT DO NOTHING;
-                """,
-                ctx.author.id,
-            )
-            await connection.execute(
-                """
-                    INSERT INTO user_configs (user_id)
-                    VALUES ($1)
-                    ON CONFLICT DO NOTHING;
-                """,
-                ctx.author.id,
-            )
-            await connection.execute(
-                """
-                    INSERT INTO user_stats (user_id)
-                    VALUES ($1)
-                    ON CONFLICT DO NOTHING;
-                """,
-                ctx.author.id,
-            )
-            await connection.execute(
-                """
-                    INSERT INTO user_skills (user_id, skill_name, skill_level, skill_xp)
-                    VALUES
-                        ($1, 'Agility', 1, 0),
-                        ($1, 'Cooking', 1, 0),
-                        ($1, 'Fishing', 1, 0);
-                """,
-                ctx.author.id,
-            )
-            await connection.execute(
-                """
-                    INSERT INTO user_cooldowns (user_id, membership_expire_ts, last_wish_ts, last_weeble_ts)
-                    VALUES ($1, $2, $2, $2);
-                """,
-                ctx.author.id,
-                fake_datetime,
-            )
+    async def register(self, bot: Uwuily) -> None:
+        fake_datetime = datetime.utcnow() - NEW_USER_COOLDOWN_AGE
+        await REGISTER_USERS.execute(bot.db, [self.user_id], list(DEFAULT_SKILLS), fake_datetime)
+        bot.registered_users.add(self.user_id)
 
     async def fetch_data(
         self,
@@ -71,43 +118,70 @@ class User:
         get_configs: bool = False,
         get_anicards: bool = False,
         get_minions: bool = False,
+        cooldown_columns: Sequence[str] = COOLDOWN_COLUMNS,
+        config_columns: Sequence[str] = CONFIG_COLUMNS,
+        anicard_columns: Sequence[str] = tuple(ANICARD_COLUMNS),
     ) -> None:
+        """Load the requested user data with a single query.
+
+        Each aspect is a subquery of the same statement, so any mix of them costs one round trip.
+        Pass the ``*_columns`` arguments to load only what the caller reads.
+        """
+
+        selects = []
         if get_cooldowns:
-            query: asyncpg.Record = await ctx.bot.db.fetchrow(
-                """
-                    SELECT *
+            selects.append(
+                f"""
+                (
+                    SELECT ROW({select_columns("user_cooldowns", cooldown_columns)})
                     FROM user_cooldowns
-                    WHERE user_id = $1;
+                    WHERE user_id = $1
+                ) AS cooldowns
                 """,
-                ctx.author.id,
             )
-            cooldown_data = dict(query) if query else {}
-            self.cooldowns = cooldown_data
-
         if get_configs:
-            query: asyncpg.Record = await ctx.bot.db.fetchrow(
-                """
-                SELECT *
-                FROM user_configs
-                WHERE user_id = $1;
+            selects.append(
+                f"""
+                (
+                    SELECT ROW({select_columns("user_configs", config_columns)})
+                    FROM user_configs
+                    WHERE user_id = $1
+                ) AS configs
                 """,
-                ctx.author.id,
             )
-            config_data = dict(query) if query else {}
-            self.configs = config_data
-
-        if get_anicards:
-            query: asyncpg.Record = await ctx.bot.db.fetch(
-                """
-                SELECT *
-                FROM user_anicards
-                JOIN minions ON user_anicards.minion_id = minions.minion_id
-                WHERE user_id = $1;
+        if get_anicards or get_minions:
+            # Minions are the summoned Anicards, they come from the anicards already loaded if possible.
+            summoned_only = "" if get_anicards else "AND user_anicards.is_summoned"
+            selects.append(
+                f"""
+                ARRAY(
+                    SELECT ROW({", ".join(ANICARD_COLUMNS[column] for column in anicard_columns)})
+                    FROM user_anicards
+                    JOIN minions ON user_anicards.minion_id = minions.minion_id
+                    WHERE user_anicards.user_id = $1 {summoned_only}
+                ) AS anicards
                 """,
-                ctx.author.id,
             )
-            anicard_data = [dict(record) for record in query]
-            self.anicards = [Anicard(**item) for item in anicard_data]
+        if not selects:
+            return
+
+        query: asyncpg.Record = await FETCH_USER_DATA.fetchrow(
+            ctx.bot.db,
+            ctx.author.id,
+            sql=f"SELECT {', '.join(selects)};",
+        )
+
+        if get_cooldowns:
+            self.cooldowns = dict(zip(cooldown_columns, query["cooldowns"], strict=True)) if query["cooldowns"] else {}
+
+        if get_configs:
+            self.configs = dict(zip(config_columns, query["configs"], strict=True)) if query["configs"] else {}
 
-        if get_minions:
-            pass
+        if get_anicards or get_minions:
+            anicards = [Anicard.from_row(columns=anicard_columns, row=row) for row in query["anicards"]]
+            if not get_anicards:
+                self.minions = anicards
+                return
+            self.anicards = anicards
+            if get_minions:
+                self.minions = [anicard for anicard in anicards if anicard.is_summoned]
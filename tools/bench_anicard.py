@@ -0,0 +1,126 @@
+"""Memory and construction time of a user's collection of Anicard objects.
+
+Builds ``--cards`` Anicards from synthetic rows the way the bot loads them, from named records
+(``Anicard.from_record``) and from the anonymous rows of ``User.fetch_data``
+(``Anicard.from_row``). For comparison it also builds them the old way, through ``dict(record)``
+into an equivalent dataclass without slots and with a per-card inventory list. Reports the
+time per card and the memory the collection holds. Needs neither Discord nor Postgres.
+
+    python -m tools.bench_anicard --cards 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import dataclasses
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+import typing as t
+from datetime import datetime, timedelta
+
+from models.anicard import Anicard
+from models.user import ANICARD_COLUMNS
+
+if t.TYPE_CHECKING:
+    from collections.abc import Callable
+
+ANICLASSES = ("⚜", "⚔", "☄")
+
+# The Anicard model as it was before it was slotted, for comparison.
+UnslottedAnicard = dataclasses.make_dataclass(
+    "UnslottedAnicard",
+    [
+        *((field.name, field.type, dataclasses.field(default=None)) for field in dataclasses.fields(Anicard)[:-1]),
+        ("inventory", list, dataclasses.field(default_factory=list)),
+    ],
+)
+
+
+def make_records(count: int) -> list[dict[str, t.Any]]:
+    obtained_ts = datetime(2023, 1, 1)
+    return [
+        {
+            "anicard_id": index,
+            "user_id": 1,
+            "minion_id": index % 500,
+            "tag": f"B{index:05X}",
+            "image_ver": 1,
+            "frame": "T1",
+            "obtained_ts": obtained_ts + timedelta(minutes=index),
+            "is_shattered": index % 7 == 0,
+            "tier": 1 + index % 3,
+            "aniclass": ANICLASSES[index % len(ANICLASSES)],
+            "codex": index // 500 + 1,
+            "xp": 0,
+            "spiritfuse_total": 0,
+            "is_summoned": index < 3,
+            "hitpoint": 100,
+            "location": None,
+            "activity": None,
+            "activity_start_ts": None,
+            "character": f"Character {index % 500}",
+            "anime": f"Anime {index % 50}",
+            "original_aniclass": ANICLASSES[index % len(ANICLASSES)],
+            "current_codex": index // 500 + 1,
+            "ability": None,
+        }
+        for index in range(count)
+    ]
+
+
+def measure(build: Callable[[], list[t.Any]], rounds: int) -> dict[str, float]:
+    timings = []
+    for _ in range(rounds):
+        gc.collect()
+        start_time = time.perf_counter()
+        anicards = build()
+        timings.append(time.perf_counter() - start_time)
+        del anicards
+
+    gc.collect()
+    tracemalloc.start()
+    anicards = build()
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(anicards)
+    return {
+        "build_ms": statistics.median(timings) * 1000,
+        "per_card_us": statistics.median(timings) / count * 1_000_000,
+        "held_mb": held / (1024 * 1024),
+        "per_card_bytes": held / count,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cards", type=int, default=10000, help="number of Anicards in the collection")
+    parser.add_argument("--rounds", type=int, default=5, help="timed builds per representation")
+    args = parser.parse_args()
+
+    records = make_records(count=args.cards)
+    columns = tuple(ANICARD_COLUMNS)
+    rows = [tuple(record[column] for column in columns) for record in records]
+    results = {
+        "unslotted, dict(record)": measure(
+            lambda: [UnslottedAnicard(**dict(record)) for record in records],
+            rounds=args.rounds,
+        ),
+        "from_record": measure(lambda: [Anicard.from_record(record) for record in records], rounds=args.rounds),
+        "from_row": measure(lambda: [Anicard.from_row(columns=columns, row=row) for row in rows], rounds=args.rounds),
+    }
+
+    lines = [f"{args.cards} cards, Python {sys.version.split()[0]}", ""]
+    lines.append(f"{'representation':<26} {'build':>10} {'per card':>10} {'held':>9} {'per card':>10}")
+    for name, result in results.items():
+        lines.append(
+            f"{name:<26} {result['build_ms']:8.1f}ms {result['per_card_us']:8.2f}us "
+            f"{result['held_mb']:7.2f}MB {result['per_card_bytes']:8.0f}B",
+        )
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+if __name__ == "__main__":
+    main()
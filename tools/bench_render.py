@@ -0,0 +1,236 @@
+"""Offline benchmark for Anicard and wish canvas rendering.
+
+Renders every (character, frame, shattered) combination found under ``assets/anicard``, plus an
+optional set of synthetic characters, once with cold caches and once warm. Reports per stage
+timings (decode, composite, text, encode), wish canvas timings and peak RSS, and can save the
+results as a JSON baseline to compare later runs against. Needs neither Discord nor Postgres.
+
+    python -m tools.bench_render --synthetic 200 --output bench.json
+    python -m tools.bench_render --baseline bench.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import typing as t
+from contextlib import contextmanager
+from pathlib import Path
+
+import PIL
+from PIL import Image
+
+import helpers.fonts as fonts
+import helpers.label as label
+import helpers.pillow as pillow
+import helpers.render as render
+from models.anicard import AnicardSpec, base_layer_cache, base_layer_paths, get_base_layer
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    from models.anicard import BaseLayerKey
+
+STAGES = ("decode", "composite", "text", "encode")
+ANICLASSES = ("⚜", "⚔", "☄")
+
+
+class StageTimer:
+    def __init__(self) -> None:
+        self.samples: dict[str, list[float]] = {stage: [] for stage in STAGES}
+
+    @contextmanager
+    def measure(self, stage: str) -> Iterator[None]:
+        start_time = time.perf_counter()
+        yield
+        self.samples[stage].append(time.perf_counter() - start_time)
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {stage: summarize(samples) for stage, samples in self.samples.items()}
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "total_ms": sum(ordered) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def make_synthetic_assets(root: Path, count: int) -> None:
+    """Copy the asset tree to ``root`` and add ``count`` generated character images."""
+
+    shutil.copytree("assets", root / "assets")
+    character_dir = root / "assets" / "anicard" / "character"
+    width, height = Image.open(next(character_dir.glob("*.png"))).size
+    rng = random.Random(0)
+    for index in range(count):
+        noise = Image.effect_noise((width, height), rng.randint(16, 96)).convert("RGBA")
+        tint = Image.new("RGBA", (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256), 255))
+        Image.blend(noise, tint, 0.6).save(character_dir / f"Synthetic{index:05d}_v1.png")
+
+
+def discover_keys() -> list[BaseLayerKey]:
+    characters = []
+    for path in sorted(Path("assets/anicard/character").glob("*_v*.png")):
+        character, image_ver = path.stem.rsplit("_v", 1)
+        characters.append((character, int(image_ver)))
+    frames = [path.stem for path in sorted(Path("assets/anicard/frame").glob("*.png"))]
+    return [
+        (character, image_ver, frame, is_shattered)
+        for character, image_ver in characters
+        for frame in frames
+        for is_shattered in (False, True)
+    ]
+
+
+def make_spec(key: BaseLayerKey, index: int) -> AnicardSpec:
+    character, image_ver, frame, is_shattered = key
+    return AnicardSpec(
+        character=character,
+        anime="Benchmark Anime",
+        tag=f"B{index:05X}",
+        image_ver=image_ver,
+        frame=frame,
+        is_shattered=is_shattered,
+        aniclass=ANICLASSES[index % len(ANICLASSES)],
+        codex=index + 1,
+    )
+
+
+def clear_caches() -> None:
+    pillow.image_cache.clear()
+    base_layer_cache.clear()
+    label.label_cache.clear()
+    fonts.registry.fonts.clear()
+
+
+def run_card_pass(keys: list[BaseLayerKey], profile: pillow.EncodeProfile) -> dict[str, dict[str, float]]:
+    timer = StageTimer()
+    for index, key in enumerate(keys):
+        spec = make_spec(key=key, index=index)
+        with timer.measure("decode"):
+            for path in base_layer_paths(key=key):
+                pillow.get_layer(image_path=path)
+        with timer.measure("composite"):
+            anicard_image = get_base_layer(key=key).copy()
+        with timer.measure("text"):
+            spec.draw_text(anicard_image=anicard_image)
+        with timer.measure("encode"):
+            pillow.encode_image(image=anicard_image, profile=profile)
+    return timer.summary()
+
+
+def run_wish_pass(keys: list[BaseLayerKey], profile: pillow.EncodeProfile, rounds: int) -> dict[str, float]:
+    rng = random.Random(1)
+    wish_keys = [key for key in keys if key[2] == "T1" and not key[3]] or keys
+    samples = []
+    for index in range(rounds):
+        specs = [make_spec(key=key, index=index * 3 + offset) for offset, key in enumerate(rng.sample(wish_keys, 3))]
+        start_time = time.perf_counter()
+        render.render_wish_canvas(specs=specs, profile=profile)
+        samples.append(time.perf_counter() - start_time)
+    return summarize(samples)
+
+
+def run(args: argparse.Namespace) -> dict[str, t.Any]:
+    keys = discover_keys()
+    profile = pillow.get_profile(args.profile)
+    clear_caches()
+    results: dict[str, t.Any] = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL.__version__,
+            "platform": platform.platform(),
+            "profile": profile.name,
+            "synthetic": args.synthetic,
+            "cards": len(keys),
+        },
+        "cold": run_card_pass(keys=keys, profile=profile),
+        "warm": run_card_pass(keys=keys, profile=profile),
+    }
+    if len(keys) >= 3:
+        results["wish_canvas"] = run_wish_pass(keys=keys, profile=profile, rounds=args.wish_rounds)
+    results["peak_rss_mb"] = peak_rss_mb()
+    return results
+
+
+def format_delta(current: float, previous: float | None) -> str:
+    if not previous:
+        return ""
+    return f" ({(current - previous) / previous * 100:+.1f}%)"
+
+
+def report(results: dict[str, t.Any], baseline: dict[str, t.Any] | None) -> None:
+    meta = results["meta"]
+    lines = [f"{meta['cards']} cards, profile {meta['profile']!r}, Pillow {meta['pillow']}, Python {meta['python']}"]
+    for run_name in ("cold", "warm"):
+        lines.append(f"\n{run_name} pass (mean / p95 per card)")
+        for stage in STAGES:
+            stats = results[run_name][stage]
+            previous = (baseline or {}).get(run_name, {}).get(stage, {}).get("mean_ms")
+            delta = format_delta(stats["mean_ms"], previous)
+            lines.append(f"  {stage:<10} {stats['mean_ms']:8.2f}ms / {stats['p95_ms']:8.2f}ms{delta}")
+    if "wish_canvas" in results:
+        stats = results["wish_canvas"]
+        previous = (baseline or {}).get("wish_canvas", {}).get("mean_ms")
+        delta = format_delta(stats["mean_ms"], previous)
+        lines.append(f"\nwish canvas  {stats['mean_ms']:8.2f}ms / {stats['p95_ms']:8.2f}ms{delta}")
+    if results["peak_rss_mb"] is not None:
+        delta = format_delta(results["peak_rss_mb"], (baseline or {}).get("peak_rss_mb"))
+        lines.append(f"peak RSS     {results['peak_rss_mb']:8.1f}MB{delta}")
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="number of generated characters to add")
+    parser.add_argument("--profile", default="default", choices=sorted(pillow.ENCODE_PROFILES))
+    parser.add_argument("--wish-rounds", type=int, default=20, help="number of wish canvases to render")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against a JSON file written by --output")
+    args = parser.parse_args()
+
+    baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8")) if args.baseline else None
+    with tempfile.TemporaryDirectory() as temporary_dir:
+        working_dir = Path.cwd()
+        if args.synthetic:
+            make_synthetic_assets(root=Path(temporary_dir), count=args.synthetic)
+            os.chdir(temporary_dir)
+        try:
+            results = run(args=args)
+        finally:
+            os.chdir(working_dir)
+
+    report(results=results, baseline=baseline)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
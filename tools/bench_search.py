@@ -0,0 +1,143 @@
+"""Speed of the in-memory minion search, and its agreement with ``pg_trgm``.
+
+Builds the trigram index over ``--minions`` synthetic minions and times top ``--limit``
+searches and unlimited (collection filter) searches for names with a typo. With ``--compare``
+it loads the real minions from ``DB_URI`` instead and checks that the memory and postgres
+backends return the same minions with the same scores for every query; that needs the
+``pg_trgm`` extension and its indexes, from ``tools.migrate --search-backend postgres``.
+
+    python -m tools.bench_search --minions 100000
+    python -m tools.bench_search --compare --queries 200
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import time
+import typing as t
+
+import asyncpg
+from decouple import config
+
+from models.minion import FETCH_MINIONS, MinionCatalog, MinionSearch
+
+CONSONANTS = ("b", "ch", "d", "g", "h", "j", "k", "m", "n", "r", "s", "sh", "t", "ts", "y", "z")
+VOWELS = ("a", "e", "i", "o", "u", "ai", "ou")
+
+
+def make_name(rng: random.Random) -> str:
+    words = []
+    for _ in range(rng.choice((1, 2, 2, 3))):
+        syllables = (rng.choice(CONSONANTS) + rng.choice(VOWELS) for _ in range(rng.choice((1, 2, 2, 3))))
+        words.append("".join(syllables).title())
+    return " ".join(words)
+
+
+def make_records(count: int, rng: random.Random) -> list[dict[str, object]]:
+    animes = [make_name(rng) for _ in range(max(1, count // 30))]
+    return [
+        {"minion_id": minion_id, "character": make_name(rng), "anime": rng.choice(animes), "original_aniclass": "⚔"}
+        for minion_id in range(1, count + 1)
+    ]
+
+
+def make_queries(catalog: MinionCatalog, count: int, rng: random.Random) -> list[str]:
+    queries = []
+    for _ in range(count):
+        index = rng.randrange(len(catalog.minion_ids))
+        text = rng.choice((catalog.characters, catalog.animes))[index]
+        if len(text) > 3:
+            typo = rng.randrange(len(text))
+            text = text[:typo] + rng.choice("aeiouxz") + text[typo + 1 :]
+        queries.append(text)
+    return queries
+
+
+async def loop_stall(build: t.Callable[..., None], **kwargs: t.Any) -> float:
+    """Longest time the event loop could not run while ``build`` ran in a thread, as a reload runs it."""
+
+    stall = 0.0
+    task = asyncio.create_task(asyncio.to_thread(build, **kwargs))
+    while not task.done():
+        start_time = time.perf_counter()
+        await asyncio.sleep(0)
+        stall = max(stall, time.perf_counter() - start_time)
+    await task
+    return stall
+
+
+async def timed(search: MinionSearch, db: asyncpg.Pool | None, queries: list[str], limit: int | None) -> list[float]:
+    timings = []
+    for query in queries:
+        start_time = time.perf_counter()
+        await search.search(db=db, query=query, limit=limit)  # type: ignore
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+def report(name: str, timings: list[float]) -> str:
+    ordered = sorted(timings)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f"{name:<16} median {statistics.median(timings) * 1000:7.3f}ms   p99 {p99 * 1000:7.3f}ms"
+
+
+async def bench(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    catalog = MinionCatalog(refresh_interval=float("inf"))
+    start_time = time.perf_counter()
+    records = make_records(count=args.minions, rng=rng)
+    catalog.append(records=records)  # type: ignore
+    build_time = time.perf_counter() - start_time
+    search = MinionSearch(catalog=catalog)
+    queries = make_queries(catalog=catalog, count=args.queries, rng=rng)
+
+    stall = await loop_stall(MinionCatalog(refresh_interval=float("inf")).append, records=records)
+
+    lines = [f"{args.minions} minions, index built in {build_time:.2f}s, longest event loop stall {stall * 1000:.1f}ms"]
+    lines.append("")
+    lines.append(report(f"top {args.limit}", await timed(search, db=None, queries=queries, limit=args.limit)))
+    lines.append(report("all matches", await timed(search, db=None, queries=queries, limit=None)))
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+async def compare(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    pool: asyncpg.Pool = await asyncpg.create_pool(str(config("DB_URI")), min_size=1, max_size=1)
+    try:
+        catalog = MinionCatalog(refresh_interval=float("inf"))
+        catalog.append(records=await FETCH_MINIONS.fetch(pool, 0))
+        memory = MinionSearch(catalog=catalog, backend="memory")
+        postgres = MinionSearch(catalog=catalog, backend="postgres")
+        queries = make_queries(catalog=catalog, count=args.queries, rng=rng)
+        mismatches = []
+        for query in queries:
+            for limit in (args.limit, None):
+                in_memory = await memory.search(db=pool, query=query, limit=limit)
+                in_postgres = await postgres.search(db=pool, query=query, limit=limit)
+                if in_memory != in_postgres:
+                    mismatches.append(f"{query!r} limit={limit}: {in_memory[:3]} != {in_postgres[:3]}")
+    finally:
+        await pool.close()
+
+    lines = [f"{len(catalog.minion_ids)} minions, {len(queries)} queries, {len(mismatches)} mismatch(es)"]
+    lines.extend(mismatches[:20])
+    sys.stdout.write("\n".join(lines) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minions", type=int, default=100000, help="number of synthetic minions")
+    parser.add_argument("--queries", type=int, default=500, help="number of searches")
+    parser.add_argument("--limit", type=int, default=10, help="results of a top k search")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the synthetic minions and queries")
+    parser.add_argument("--compare", action="store_true", help="compare the backends on the minions of DB_URI")
+    args = parser.parse_args()
+    asyncio.run(compare(args) if args.compare else bench(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Register many Discord user ids at once, e.g. before a big server adds the bot.
+
+Reads user ids, one per line (anything after the first comma or whitespace is ignored), skips
+the ids that are already registered and writes the rest with ``COPY`` into ``users``,
+``user_configs``, ``user_stats``, ``user_skills`` and ``user_cooldowns``. Each batch is one
+transaction, so a failed batch leaves no half registered users. Uses ``DB_URI``.
+
+    python -m tools.import_users user_ids.txt --batch-size 10000
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+import typing as t
+from datetime import datetime
+from pathlib import Path
+
+import asyncpg
+from decouple import config
+
+from models.user import DEFAULT_SKILLS, NEW_USER_COOLDOWN_AGE
+
+if t.TYPE_CHECKING:
+    from collections.abc import Iterator
+
+
+def read_user_ids(path: Path) -> list[int]:
+    user_ids = []
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            field = line.replace(",", " ").split(maxsplit=1)
+            if field and field[0].isdigit():
+                user_ids.append(int(field[0]))
+    return list(dict.fromkeys(user_ids))
+
+
+def batches(user_ids: list[int], batch_size: int) -> Iterator[list[int]]:
+    for start in range(0, len(user_ids), batch_size):
+        yield user_ids[start : start + batch_size]
+
+
+async def import_batch(connection: asyncpg.Connection, user_ids: list[int], cooldown_ts: datetime) -> int:
+    async with connection.transaction():
+        # Keep concurrent registrations out until the batch is written.
+        await connection.execute("LOCK TABLE users IN SHARE ROW EXCLUSIVE MODE;")
+        registered = await connection.fetch("SELECT user_id FROM users WHERE user_id = ANY($1::bigint[]);", user_ids)
+        registered_ids = {record["user_id"] for record in registered}
+        new_ids = [(user_id,) for user_id in user_ids if user_id not in registered_ids]
+        if not new_ids:
+            return 0
+
+        await connection.copy_records_to_table("users", records=new_ids, columns=["user_id"])
+        await connection.copy_records_to_table("user_configs", records=new_ids, columns=["user_id"])
+        await connection.copy_records_to_table("user_stats", records=new_ids, columns=["user_id"])
+        await connection.copy_records_to_table(
+            "user_skills",
+            records=[(user_id, skill_name, 1, 0) for (user_id,) in new_ids for skill_name in DEFAULT_SKILLS],
+            columns=["user_id", "skill_name", "skill_level", "skill_xp"],
+        )
+        await connection.copy_records_to_table(
+            "user_cooldowns",
+            records=[(user_id, cooldown_ts, cooldown_ts, cooldown_ts) for (user_id,) in new_ids],
+            columns=["user_id", "membership_expire_ts", "last_wish_ts", "last_weeble_ts"],
+        )
+    return len(new_ids)
+
+
+async def import_users(user_ids: list[int], batch_size: int) -> int:
+    cooldown_ts = datetime.utcnow() - NEW_USER_COOLDOWN_AGE
+    connection: asyncpg.Connection = await asyncpg.connect(str(config("DB_URI")))
+    imported = 0
+    try:
+        for batch in batches(user_ids=user_ids, batch_size=batch_size):
+            imported += await import_batch(connection=connection, user_ids=batch, cooldown_ts=cooldown_ts)
+    finally:
+        await connection.close()
+    return imported
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", type=Path, help="file with one user id per line")
+    parser.add_argument("--batch-size", type=int, default=10000, help="users written per transaction")
+    args = parser.parse_args()
+
+    user_ids = read_user_ids(path=args.path)
+    start_time = time.perf_counter()
+    imported = asyncio.run(import_users(user_ids=user_ids, batch_size=args.batch_size))
+    elapsed = time.perf_counter() - start_time
+    sys.stdout.write(
+        f"Registered {imported} of {len(user_ids)} user(s), {len(user_ids) - imported} already registered, "
+        f"in {elapsed:.2f}s ({imported / elapsed if elapsed else 0:.0f} users/s).\n",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Apply the schema the bot relies on beyond its tables to the database of ``DB_URI``, or ``--dsn``.
+
+Every step can run again without changing anything, so the script is safe to run before each
+deploy. The bot itself runs no DDL, its role needs no more than reading and writing rows.
+
+- ``minions_version``, a version bumped by a trigger on every change of the minions the
+  minion catalog holds, which the catalog polls to know when to reload.
+- The indexes of ``INDEXES``. They are built with ``CREATE INDEX CONCURRENTLY`` so that the
+  tables keep taking writes. A concurrent build that failed or was interrupted leaves an
+  invalid index behind, which is dropped and built again.
+- With the ``postgres`` backend of the minion search, ``SEARCH_BACKEND`` or ``--search-backend``,
+  the ``pg_trgm`` extension and the trigram indexes of ``SEARCH_INDEXES``. Creating the
+  extension usually takes a superuser, so pass such a role with ``--dsn``. The default
+  ``memory`` backend needs neither.
+
+    python -m tools.migrate
+    python -m tools.migrate --search-backend postgres --dsn postgres://admin@localhost/uwuily
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+
+import asyncpg
+from decouple import config
+
+STATEMENTS = (
+    """
+    CREATE TABLE IF NOT EXISTS minions_version (
+        singleton boolean PRIMARY KEY DEFAULT true CHECK (singleton),
+        version bigint NOT NULL DEFAULT 0
+    );
+    """,
+    "INSERT INTO minions_version DEFAULT VALUES ON CONFLICT DO NOTHING;",
+    """
+    CREATE OR REPLACE FUNCTION bump_minions_version() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        UPDATE minions_version SET version = version + 1;
+        RETURN NULL;
+    END;
+    $$;
+    """,
+    # Reserving codexes only updates current_codex, which the catalog does not hold.
+    """
+    DROP TRIGGER IF EXISTS minions_version_bump ON minions;
+    CREATE TRIGGER minions_version_bump
+    AFTER INSERT OR UPDATE OF minion_id, character, anime, original_aniclass OR DELETE OR TRUNCATE ON minions
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_minions_version();
+    """,
+)
+# Index name -> what it indexes.
+INDEXES = {
+    # Summons look an Anicard up by tag and count the user's summoned ones.
+    "user_anicards_user_id_tag_idx": "ON user_anicards (user_id, tag)",
+    "user_anicards_user_id_is_summoned_idx": "ON user_anicards (user_id, is_summoned)",
+}
+SEARCH_STATEMENTS = ("CREATE EXTENSION IF NOT EXISTS pg_trgm;",)
+# The postgres backend of the minion search matches characters and animes with ``%``.
+SEARCH_INDEXES = {
+    "minions_character_trgm_idx": "ON minions USING gin (character gin_trgm_ops)",
+    "minions_anime_trgm_idx": "ON minions USING gin (anime gin_trgm_ops)",
+}
+
+
+async def build_index(connection: asyncpg.Connection, name: str, definition: str) -> None:
+    is_valid: bool | None = await connection.fetchval(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass($1);",
+        name,
+    )
+    if is_valid is False:
+        await connection.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name};")
+    # Not in a transaction, which CONCURRENTLY does not allow.
+    await connection.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition};")
+
+
+async def migrate(dsn: str, search_backend: str) -> int:
+    statements, indexes = list(STATEMENTS), dict(INDEXES)
+    if search_backend == "postgres":
+        statements.extend(SEARCH_STATEMENTS)
+        indexes.update(SEARCH_INDEXES)
+    connection: asyncpg.Connection = await asyncpg.connect(dsn)
+    try:
+        for statement in statements:
+            await connection.execute(statement)
+        for name, definition in indexes.items():
+            await build_index(connection=connection, name=name, definition=definition)
+    finally:
+        await connection.close()
+    return len(statements) + len(indexes)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=None, help="database to migrate, DB_URI by default")
+    parser.add_argument(
+        "--search-backend",
+        choices=("memory", "postgres"),
+        default=config("SEARCH_BACKEND", default="memory"),
+        help="minion search backend to migrate for, SEARCH_BACKEND by default",
+    )
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    applied = asyncio.run(migrate(dsn=args.dsn or str(config("DB_URI")), search_backend=args.search_backend))
+    sys.stdout.write(f"Applied {applied} step(s) in {time.perf_counter() - start_time:.2f}s.\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Pack the Anicard images into a single pre-decoded asset pack.
+
+Decodes every PNG under ``assets/anicard`` (characters, frames, the shattered overlay and the
+wish canvas) into raw pixels and writes them, page aligned, after a JSON index. At runtime
+``helpers.asset_pack`` memory-maps the pack instead of decoding the PNGs. Re-run this after
+adding or changing images; entries whose source changed are ignored until then.
+
+    python -m tools.pack_assets
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from PIL import Image
+
+from helpers.asset_pack import HEADER, MAGIC, MAPPABLE_MODES, align
+
+
+def decode(path: Path) -> Image.Image:
+    with Image.open(path) as image:
+        image.load()
+        if image.mode in MAPPABLE_MODES:
+            return image.copy()
+        return image.convert("RGBA")
+
+
+def pack(source_dir: str, output_path: str) -> tuple[int, int]:
+    index: dict[str, dict] = {}
+    blobs: list[bytes] = []
+    offset = 0
+    for path in sorted(Path(source_dir).rglob("*.png")):
+        image = decode(path)
+        blob = image.tobytes()
+        stat = path.stat()
+        index[path.as_posix()] = {
+            "mode": image.mode,
+            "width": image.width,
+            "height": image.height,
+            "offset": offset,
+            "length": len(blob),
+            "source_size": stat.st_size,
+            "source_mtime_ns": stat.st_mtime_ns,
+        }
+        blobs.append(blob)
+        offset = align(offset + len(blob))
+
+    encoded_index = json.dumps(index).encode()
+    data_start = align(HEADER.size + len(encoded_index))
+    temporary_path = f"{output_path}.tmp"
+    with open(temporary_path, mode="wb") as f:
+        f.write(HEADER.pack(MAGIC, len(encoded_index)))
+        f.write(encoded_index)
+        for entry, blob in zip(index.values(), blobs, strict=True):
+            f.seek(data_start + entry["offset"])
+            f.write(blob)
+    os.replace(temporary_path, output_path)
+    return len(index), os.path.getsize(output_path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default="assets/anicard", help="directory of images to pack")
+    parser.add_argument("--output", default="assets/anicard.pack", help="path of the asset pack to write")
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    image_count, pack_size = pack(source_dir=args.source, output_path=args.output)
+    elapsed = time.perf_counter() - start_time
+    sys.stdout.write(
+        f"Packed {image_count} image(s) into {args.output} ({pack_size / (1024 * 1024):.1f}MB) in {elapsed:.2f}s.\n",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
+import re
+from collections.abc import Awaitable, Callable
+
 import discord
 from discord.ext import commands
 
+import views.persistent as persistent
 from helpers.message import MessageTemplate
 
+CONFIRM_TIMEOUT = 300
+
+# Persistent confirm actions by name, called with the interaction and the answer once the owner answers.
+confirm_actions: dict[str, Callable[[discord.Interaction, bool], Awaitable[None]]] = {}
+
 
 class ConfirmView(discord.ui.View):
     def __init__(self, ctx: commands.Context) -> None:
-        super().__init__(timeout=300)
+        super().__init__(timeout=CONFIRM_TIMEOUT)
         self.ctx = ctx
         self.view_message: discord.Message
         self.result = None
@@ -75,3 +84,60 @@ async def send_confirm_view(ctx: commands.Context, message: str, embed: discord.
     view.view_message = await ctx.send(content=message, embed=embed, view=view)  # type: ignore
     await view.wait()
     return view.result
+
+
+class ConfirmButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"confirm:(?P<action>\w+):(?P<answer>yes|no):(?P<owner_id>\d+):(?P<expires_at>\d+)",
+):
+    """Stateless YES or NO button, the confirm action named in its ``custom_id`` gets the answer."""
+
+    def __init__(self, action: str, answer: str, owner_id: int, expires_at: int) -> None:
+        super().__init__(
+            discord.ui.Button(
+                label=answer.upper(),
+                style=discord.ButtonStyle.gray,
+                custom_id=f"confirm:{action}:{answer}:{owner_id}:{expires_at}",
+            ),
+        )
+        self.action = action
+        self.answer = answer
+        self.owner_id = owner_id
+        self.expires_at = expires_at
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        _: discord.Interaction,
+        __: discord.ui.Button,
+        match: re.Match[str],
+    ) -> "ConfirmButton":
+        return cls(
+            action=match["action"],
+            answer=match["answer"],
+            owner_id=int(match["owner_id"]),
+            expires_at=int(match["expires_at"]),
+        )
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        if await persistent.reject_other_user(interaction=interaction, owner_id=self.owner_id):
+            return None
+        action = confirm_actions.get(self.action)
+        if persistent.is_expired(self.expires_at) or action is None:
+            await persistent.expire(interaction=interaction, view=self.view, owner_id=self.owner_id)  # type: ignore
+            return None
+
+        result = self.answer == "yes"
+        view: discord.ui.View = self.view  # type: ignore
+        persistent.disable_all(view)
+        self.item.style = discord.ButtonStyle.green if result else discord.ButtonStyle.red
+        await interaction.response.edit_message(view=persistent.detached(view))
+        await action(interaction, result)
+
+
+def persistent_confirm_view(action: str, owner_id: int) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    expires_at = persistent.expires_at(timeout=CONFIRM_TIMEOUT)
+    for answer in ("yes", "no"):
+        view.add_item(ConfirmButton(action=action, answer=answer, owner_id=owner_id, expires_at=expires_at))
+    return persistent.detached(view)
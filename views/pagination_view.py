@@ -1,29 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import inspect
+import typing as t
+from collections import OrderedDict
+
 import discord
-from discord.ext import commands
+from loguru import logger
 
 import helpers.message as message
+import views.persistent as persistent
+
+if t.TYPE_CHECKING:
+    import re
+
+    from discord.ext import commands
+
+    from helpers.pillow import EncodedImage
+
+    ImageProvider = t.Callable[[int], t.Awaitable[EncodedImage]]
+    PageProvider = t.Callable[[int], discord.Embed | t.Awaitable[discord.Embed]]
+    # (owner, state, page) -> embed and attachments of the page, and the number of pages.
+    PageSource = t.Callable[
+        [discord.abc.User, str, int],
+        t.Awaitable[tuple[discord.Embed, list[discord.File], int]],
+    ]
+
+PAGINATION_TIMEOUT = 300
+
+# Persistent page sources by name, registered by the cogs that send persistent pages.
+page_sources: dict[str, PageSource] = {}
+
+# Persistent page button action -> its emoji.
+PAGE_ACTIONS = {"first": "⏪", "previous": "◀", "next": "▶", "last": "⏩"}
+
+
+def page_footer(embed: discord.Embed, page: int, page_count: int) -> discord.Embed:
+    return embed.set_footer(text=f"Page {page+1} of {page_count}")
 
 
 class PaginationView(discord.ui.View):
-    """Pagination view for embeds."""
+    """Pagination view for embeds.
+
+    Pages are either given up front as ``embeds``, or built on demand by a ``page_provider``, a
+    plain or async function of the page number, for ``page_count`` pages. A page is only built
+    when it is shown, and the last ``PAGE_CACHE_SIZE`` built pages are kept so paging back and
+    forth does not build them again.
+
+    With an ``image_provider`` every page also gets an image, rendered lazily for the page being
+    shown while the next page is prefetched in the background. The renders of the last
+    ``IMAGE_CACHE_SIZE`` pages are kept. Pages whose image is not ready within ``IMAGE_BUDGET``
+    seconds are shown without one.
+    """
+
+    IMAGE_BUDGET = 2.0
+    PAGE_CACHE_SIZE = 4
+    IMAGE_CACHE_SIZE = 4
 
-    def __init__(self, ctx: commands.Context, embeds: list[discord.Embed]) -> None:
-        super().__init__(timeout=300)
+    def __init__(
+        self,
+        ctx: commands.Context,
+        embeds: list[discord.Embed] | None = None,
+        image_provider: ImageProvider | None = None,
+        page_provider: PageProvider | None = None,
+        page_count: int | None = None,
+    ) -> None:
+        super().__init__(timeout=PAGINATION_TIMEOUT)
         self.ctx = ctx
         self.view_message: discord.Message
-        self.embeds = embeds
+        if embeds is not None:
+            page_provider = embeds.__getitem__
+            page_count = len(embeds)
+        self.page_provider = page_provider
+        self.page_count = page_count or 0
+        self.embeds: OrderedDict[int, discord.Embed] = OrderedDict()
+        self.image_provider = image_provider
+        self.image_tasks: OrderedDict[int, asyncio.Task[EncodedImage]] = OrderedDict()
         self.current_embed_pagenumber = 0
         self.first_page.disabled = True
         self.previous_page.disabled = True
-        self.next_page.disabled = len(self.embeds) == 1
-        self.last_page.disabled = len(self.embeds) == 1
+        self.next_page.disabled = self.page_count == 1
+        self.last_page.disabled = self.page_count == 1
+
+    async def page_embed(self, page: int) -> discord.Embed:
+        if page in self.embeds:
+            self.embeds.move_to_end(page)
+            return self.embeds[page]
+
+        embed = self.page_provider(page)  # type: ignore
+        if inspect.isawaitable(embed):
+            embed = await embed
+        page_footer(embed=embed, page=page, page_count=self.page_count)
+        self.embeds[page] = embed
+        while len(self.embeds) > self.PAGE_CACHE_SIZE:
+            self.embeds.popitem(last=False)
+        return embed
+
+    def image_task(self, page: int) -> asyncio.Task[EncodedImage]:
+        if page in self.image_tasks:
+            self.image_tasks.move_to_end(page)
+            return self.image_tasks[page]
+
+        task = asyncio.create_task(self.image_provider(page))  # type: ignore
+        self.image_tasks[page] = task
+        while len(self.image_tasks) > self.IMAGE_CACHE_SIZE:
+            _, evicted_task = self.image_tasks.popitem(last=False)
+            evicted_task.cancel()
+        return task
 
-        for i, embed in enumerate(self.embeds):
-            embed.set_footer(text=f"Page {i+1} of {len(self.embeds)}")
+    async def page_content(self, page: int) -> tuple[discord.Embed, list[discord.File]]:
+        """Embed and attachments of a page, prefetching the image of the page after it."""
+
+        embed = await self.page_embed(page=page)
+        if not self.image_provider:
+            return embed, []
+
+        task = self.image_task(page=page)
+        if page + 1 < self.page_count:
+            self.image_task(page=page + 1)
+        try:
+            image: EncodedImage | None = await asyncio.wait_for(asyncio.shield(task), timeout=self.IMAGE_BUDGET)
+        except TimeoutError:
+            image = None
+        except Exception:
+            logger.exception(f"Could not render the image of page {page + 1}.")
+            self.image_tasks.pop(page, None)
+            image = None
+
+        if not image:
+            embed.set_image(url=None)
+            return embed, []
+        embed.set_image(url=f"attachment://{image.filename}")
+        return embed, [image.to_file()]
+
+    async def show_page(self, interaction: discord.Interaction) -> None:
+        embed, attachments = await self.page_content(page=self.current_embed_pagenumber)
+        await interaction.response.edit_message(embed=embed, attachments=attachments, view=self)
 
     async def on_timeout(self) -> None:
         """Actions after timeout."""
 
+        for task in self.image_tasks.values():
+            task.cancel()
         for item in self.children:
             item.disabled = True  # type: ignore
         timeout_message = f"{self.ctx.author.mention} {message.MessageTemplate.VIEW_EXPIRED}"
@@ -39,14 +157,13 @@ class PaginationView(discord.ui.View):
         """Go to the first page."""
 
         self.current_embed_pagenumber = 0
-        embed = self.embeds[self.current_embed_pagenumber]
 
         self.first_page.disabled = True
         self.previous_page.disabled = True
         self.next_page.disabled = False
         self.last_page.disabled = False
 
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show_page(interaction=interaction)
 
     @discord.ui.button(
         emoji="◀",
@@ -56,7 +173,6 @@ class PaginationView(discord.ui.View):
         """Go to the previous page."""
 
         self.current_embed_pagenumber -= 1
-        embed = self.embeds[self.current_embed_pagenumber]
 
         self.next_page.disabled = False
         self.last_page.disabled = False
@@ -64,7 +180,7 @@ class PaginationView(discord.ui.View):
             self.first_page.disabled = True
             self.previous_page.disabled = True
 
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show_page(interaction=interaction)
 
     @discord.ui.button(
         emoji="▶",
@@ -74,15 +190,14 @@ class PaginationView(discord.ui.View):
         """Go to the next page."""
 
         self.current_embed_pagenumber += 1
-        embed = self.embeds[self.current_embed_pagenumber]
 
         self.first_page.disabled = False
         self.previous_page.disabled = False
-        if self.current_embed_pagenumber == len(self.embeds) - 1:
+        if self.current_embed_pagenumber == self.page_count - 1:
             self.next_page.disabled = True
             self.last_page.disabled = True
 
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show_page(interaction=interaction)
 
     @discord.ui.button(
         emoji="⏩",
@@ -91,12 +206,155 @@ class PaginationView(discord.ui.View):
     async def last_page(self, interaction: discord.Interaction, _: discord.ui.Button) -> None:
         """Go to the last page."""
 
-        self.current_embed_pagenumber = len(self.embeds) - 1
-        embed = self.embeds[self.current_embed_pagenumber]
+        self.current_embed_pagenumber = self.page_count - 1
 
         self.first_page.disabled = False
         self.previous_page.disabled = False
         self.next_page.disabled = True
         self.last_page.disabled = True
 
-        await interaction.response.edit_message(embed=embed, view=self)
+        await self.show_page(interaction=interaction)
+
+
+class PageButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=(
+        r"page:(?P<source>\w+):(?P<action>first|previous|next|last):(?P<owner_id>\d+):(?P<expires_at>\d+)"
+        r":(?P<page>\d+):(?P<page_count>\d+):(?P<state>[A-Za-z0-9_-]*)"
+    ),
+):
+    """Stateless pagination button, its ``custom_id`` holds the page it was shown on.
+
+    The page source named in the ``custom_id`` builds the target page again from the owner and
+    the source's ``state``, such as a collection filter, kept in URL-safe base64 so that any text
+    matches the template. Every page shown moves the expiry
+    ``PAGINATION_TIMEOUT`` seconds ahead, like the timeout of ``PaginationView``.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        action: str,
+        owner_id: int,
+        expires_at: int,
+        page: int,
+        page_count: int,
+        state: str,
+    ) -> None:
+        super().__init__(
+            discord.ui.Button(
+                emoji=PAGE_ACTIONS[action],
+                style=discord.ButtonStyle.blurple,
+                custom_id=(
+                    f"page:{source}:{action}:{owner_id}:{expires_at}:{page}:{page_count}:"
+                    f"{persistent.encode_state(state)}"
+                ),
+            ),
+        )
+        self.source = source
+        self.action = action
+        self.owner_id = owner_id
+        self.expires_at = expires_at
+        self.page = page
+        self.page_count = page_count
+        self.state = state
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        _: discord.Interaction,
+        __: discord.ui.Button,
+        match: re.Match[str],
+    ) -> PageButton:
+        return cls(
+            source=match["source"],
+            action=match["action"],
+            owner_id=int(match["owner_id"]),
+            expires_at=int(match["expires_at"]),
+            page=int(match["page"]),
+            page_count=int(match["page_count"]),
+            state=persistent.decode_state(match["state"]),
+        )
+
+    def target_page(self) -> int:
+        targets = {
+            "first": 0,
+            "previous": self.page - 1,
+            "next": self.page + 1,
+            "last": self.page_count - 1,
+        }
+        return max(0, targets[self.action])
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        if await persistent.reject_other_user(interaction=interaction, owner_id=self.owner_id):
+            return None
+        source = page_sources.get(self.source)
+        if persistent.is_expired(self.expires_at) or source is None:
+            await persistent.expire(interaction=interaction, view=self.view, owner_id=self.owner_id)  # type: ignore
+            return None
+
+        await interaction.response.defer()
+        embed, attachments, page_count = await source(interaction.user, self.state, self.target_page())
+        page_count = max(1, page_count)
+        page = max(0, min(self.target_page(), page_count - 1))
+        embed = page_footer(embed=embed, page=page, page_count=page_count)
+        view = persistent_page_view(
+            source=self.source,
+            owner_id=self.owner_id,
+            state=self.state,
+            page=page,
+            page_count=page_count,
+        )
+        if view is None:
+            # The collection grew past what fits in a custom id, the page is shown without paging.
+            persistent.disable_all(self.view)  # type: ignore
+            await interaction.edit_original_response(
+                content=f"<@{self.owner_id}> {message.MessageTemplate.VIEW_EXPIRED}",
+                embed=embed,
+                attachments=attachments,
+                view=persistent.detached(self.view),  # type: ignore
+            )
+            return None
+        await interaction.edit_original_response(embed=embed, attachments=attachments, view=view)
+
+
+def persistent_page_view(
+    source: str,
+    owner_id: int,
+    state: str,
+    page: int,
+    page_count: int,
+) -> discord.ui.View | None:
+    """Stateless pagination buttons of a page, or ``None`` when ``state`` does not fit in a ``custom_id``.
+
+    The length is checked on the longest ``custom_id`` of any page, so buttons that fit on the
+    first page also fit once the page number gains digits.
+    """
+
+    view = discord.ui.View(timeout=None)
+    expires_at = persistent.expires_at(timeout=PAGINATION_TIMEOUT)
+    longest = PageButton(
+        source=source,
+        action="previous",
+        owner_id=owner_id,
+        expires_at=expires_at,
+        page=max(page, page_count - 1),
+        page_count=page_count,
+        state=state,
+    )
+    if not persistent.fits(longest.custom_id):
+        return None
+    for action in PAGE_ACTIONS:
+        button = PageButton(
+            source=source,
+            action=action,
+            owner_id=owner_id,
+            expires_at=expires_at,
+            page=page,
+            page_count=page_count,
+            state=state,
+        )
+        is_first_page, is_last_page = page == 0, page >= page_count - 1
+        button.item.disabled = is_first_page if action in ("first", "previous") else is_last_page
+        view.add_item(button)
+    return persistent.detached(view)
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import base64
+import time
+import typing as t
+
+from decouple import config
+
+import helpers.message as message
+
+if t.TYPE_CHECKING:
+    import discord
+
+# Send wish, collection and registration prompts as stateless persistent views.
+PERSISTENT_VIEWS: bool = config("PERSISTENT_VIEWS", default=False, cast=bool)
+
+# Discord rejects longer custom ids.
+CUSTOM_ID_MAX_LENGTH = 100
+
+
+def expires_at(timeout: float) -> int:
+    return int(time.time() + timeout)
+
+
+def is_expired(expires_at: int) -> bool:
+    return time.time() > expires_at
+
+
+def fits(custom_id: str) -> bool:
+    return len(custom_id) <= CUSTOM_ID_MAX_LENGTH
+
+
+def encode_state(state: str) -> str:
+    """Free text as URL-safe base64 without padding, which any ``custom_id`` template can match."""
+
+    return base64.urlsafe_b64encode(state.encode()).decode().rstrip("=")
+
+
+def decode_state(encoded: str) -> str:
+    return base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode()
+
+
+def component(item: discord.ui.Item) -> discord.ui.Item:
+    """The component of a view child, unwrapping dynamic items, which have no ``disabled`` or ``style``."""
+
+    return getattr(item, "item", item)
+
+
+def disable_all(view: discord.ui.View) -> None:
+    for item in view.children:
+        component(item).disabled = True  # type: ignore
+
+
+def detached(view: discord.ui.View) -> discord.ui.View:
+    """Stop ``view`` so that sending or editing a message with it does not keep it in memory.
+
+    discord.py keeps every unfinished view it sends in its view store until the view times out.
+    Persistent items are dispatched from their ``custom_id`` alone, so their views are stopped
+    before they are sent and nothing is kept per prompt.
+    """
+
+    view.stop()
+    return view
+
+
+async def reject_other_user(interaction: discord.Interaction, owner_id: int) -> bool:
+    """Tell anyone but the owner of a prompt that it is not theirs, returning whether they were told."""
+
+    if interaction.user.id == owner_id:
+        return False
+    await interaction.response.send_message(
+        content=f"{interaction.user.mention} {message.MessageTemplate.VIEW_NOT_AUTHOR}",
+        ephemeral=True,
+    )
+    return True
+
+
+async def expire(interaction: discord.Interaction, view: discord.ui.View, owner_id: int) -> None:
+    disable_all(view)
+    await interaction.response.edit_message(
+        content=f"<@{owner_id}> {message.MessageTemplate.VIEW_EXPIRED}",
+        view=detached(view),
+    )
@@ -1,3 +1,4 @@
+import re
 from datetime import datetime
 
 import asyncpg
@@ -5,15 +6,97 @@ import discord
 from discord.ext import commands
 
 import helpers.message as message
+import views.persistent as persistent
+from helpers.query import Query
+from models.anicard import Anicard
+from models.user import LOCK_USER_CONFIGS
+
+WISH_TIMEOUT = 300
+
+# Columns of a new Anicard returned by its insert.
+INSERTED_COLUMNS = """
+            anicard_id,
+            user_id,
+            minion_id,
+            tag,
+            image_ver,
+            frame,
+            obtained_ts,
+            is_shattered,
+            tier,
+            aniclass,
+            codex,
+            is_summoned
+"""
+
+INSERT_ANICARD = Query(
+    name="user_anicards.insert",
+    sql=f"""
+        INSERT INTO user_anicards(
+            user_id,
+            minion_id,
+            tag,
+            obtained_ts,
+            aniclass,
+            codex
+        )
+        VALUES($1, $2, $3, $4, $5, $6)
+        RETURNING {INSERTED_COLUMNS}
+    """,
+)
+# The Anicards of one wish share its obtained_ts, so only the first claim of a wish inserts.
+CLAIM_ANICARD = Query(
+    name="user_anicards.claim",
+    sql=f"""
+        INSERT INTO user_anicards(
+            user_id,
+            minion_id,
+            tag,
+            obtained_ts,
+            aniclass,
+            codex
+        )
+        SELECT $1, $2, $3, $4, $5, $6
+        WHERE NOT EXISTS (
+            SELECT 1
+            FROM user_anicards
+            WHERE user_id = $1 AND obtained_ts = $4
+        )
+        RETURNING {INSERTED_COLUMNS}
+    """,
+)
+
+
+def codex_rejected(error: asyncpg.UniqueViolationError) -> bool:
+    """Whether the codex of a failed insert may be taken, so that it must not be handed out again.
+
+    Only a violation known to be on the tag leaves the codex free.
+    """
+
+    constraint = error.constraint_name or ""
+    return "tag" not in constraint or "codex" in constraint
 
 
 class WishView(discord.ui.View):
     def __init__(self, ctx: commands.Context) -> None:
-        super().__init__(timeout=300)
+        super().__init__(timeout=WISH_TIMEOUT)
         self.ctx = ctx
         self.view_message: discord.Message
+        self.claimed = False
+
+    def release_codexes(self, kept_button: discord.ui.Button | None = None) -> None:
+        """Give back the codexes of the wish, all but the one of ``kept_button``.
+
+        That codex belongs to the Anicard added to the collection, or was rejected as taken.
+        """
+
+        for item in self.children:
+            if isinstance(item, WishButton) and item is not kept_button:
+                self.ctx.bot.codex_allocator.release(minion_id=item.minion_id, codex=item.codex)
 
     async def on_timeout(self) -> None:
+        if not self.claimed:
+            self.release_codexes()
         for item in self.children:
             item.disabled = True  # type: ignore
         timeout_message = f"{self.ctx.author.mention} {message.MessageTemplate.VIEW_EXPIRED}"
@@ -26,6 +109,7 @@ class WishButton(discord.ui.Button):
         ctx: commands.Context,
         minion_id: int,
         character: str,
+        anime: str,
         aniclass: str,
         codex: int,
         tag: str,
@@ -35,6 +119,7 @@ class WishButton(discord.ui.Button):
         self.ctx = ctx
         self.minion_id = minion_id
         self.character = character
+        self.anime = anime
         self.aniclass = aniclass
         self.codex = codex
         self.tag = tag
@@ -49,24 +134,18 @@ class WishButton(discord.ui.Button):
         if not interaction.response.is_done():
             await interaction.response.defer()
 
+        if self.view.claimed:  # type: ignore
+            return None
+        self.view.claimed = True  # type: ignore
+
         self.style = discord.ButtonStyle.blurple
         for item in self.view.children:  # type: ignore
             item.disabled = True
         await interaction.message.edit(view=self.view)  # type: ignore
 
         try:
-            await self.ctx.bot.db.execute(
-                """
-                INSERT INTO user_anicards(
-                    user_id,
-                    minion_id,
-                    tag,
-                    obtained_ts,
-                    aniclass,
-                    codex
-                )
-                VALUES($1, $2, $3, $4, $5, $6)
-                """,
+            record: asyncpg.Record = await INSERT_ANICARD.fetchrow(
+                self.ctx.bot.db,
                 self.ctx.author.id,
                 self.minion_id,
                 self.tag,
@@ -74,9 +153,123 @@ class WishButton(discord.ui.Button):
                 self.aniclass,
                 self.codex,
             )
-        except asyncpg.UniqueViolationError:
+        except asyncpg.UniqueViolationError as error:
+            self.view.release_codexes(kept_button=self if codex_rejected(error) else None)  # type: ignore
             await self.ctx.send("gglol")
             return None
+        self.view.release_codexes(kept_button=self)  # type: ignore
+        self.ctx.bot.collection_indexes.add(
+            user_id=self.ctx.author.id,
+            anicard=Anicard(**record, character=self.character, anime=self.anime),
+        )
 
         wish_success_message = f"`{self.character}` with Tag of `{self.tag}` has been added to your collection!"
         await message.Send.success(ctx=self.ctx, message=wish_success_message)
+
+
+class WishClaimButton(
+    discord.ui.DynamicItem[discord.ui.Button],
+    template=r"wish:(?P<owner_id>\d+):(?P<wished_at>\d+):(?P<minion_id>\d+):(?P<codex>\d+):(?P<tag>[A-Z0-9]+)",
+):
+    """Stateless wish button, its ``custom_id`` holds everything needed to claim its Anicard.
+
+    The buttons of one wish share the wish time, which becomes the ``obtained_ts`` of the
+    claimed Anicard, so a wish is claimed at most once whichever process handles the click.
+    The wish expires ``WISH_TIMEOUT`` seconds after it was made.
+    """
+
+    def __init__(
+        self,
+        owner_id: int,
+        wished_at: int,
+        minion_id: int,
+        codex: int,
+        tag: str,
+        label: str | None = None,
+    ) -> None:
+        super().__init__(
+            discord.ui.Button(
+                label=label,
+                style=discord.ButtonStyle.gray,
+                custom_id=f"wish:{owner_id}:{wished_at}:{minion_id}:{codex}:{tag}",
+            ),
+        )
+        self.owner_id = owner_id
+        self.wished_at = wished_at
+        self.minion_id = minion_id
+        self.codex = codex
+        self.tag = tag
+
+    @classmethod
+    async def from_custom_id(
+        cls,
+        _: discord.Interaction,
+        item: discord.ui.Button,
+        match: re.Match[str],
+    ) -> "WishClaimButton":
+        return cls(
+            owner_id=int(match["owner_id"]),
+            wished_at=int(match["wished_at"]),
+            minion_id=int(match["minion_id"]),
+            codex=int(match["codex"]),
+            tag=match["tag"],
+            label=item.label,
+        )
+
+    def release_codexes(self, bot: commands.Bot, keep_own: bool = True) -> None:
+        """Give back the codexes of the wish, but this button's when ``keep_own``.
+
+        Its codex is kept when its Anicard was claimed or the codex was rejected as taken.
+        """
+
+        for item in self.view.children:  # type: ignore
+            match = self.template.fullmatch(getattr(item, "custom_id", None) or "")
+            if match and not (keep_own and match["tag"] == self.tag):
+                bot.codex_allocator.release(minion_id=int(match["minion_id"]), codex=int(match["codex"]))  # type: ignore
+
+    async def callback(self, interaction: discord.Interaction) -> None:
+        if await persistent.reject_other_user(interaction=interaction, owner_id=self.owner_id):
+            return None
+        if persistent.is_expired(self.wished_at + WISH_TIMEOUT):
+            await persistent.expire(interaction=interaction, view=self.view, owner_id=self.owner_id)  # type: ignore
+            return None
+
+        self.item.style = discord.ButtonStyle.blurple
+        persistent.disable_all(self.view)  # type: ignore
+        await interaction.response.edit_message(view=persistent.detached(self.view))  # type: ignore
+
+        bot: commands.Bot = interaction.client  # type: ignore
+        minion = bot.minion_catalog.find(minion_id=self.minion_id)  # type: ignore
+        if minion is None:
+            await message.Send.error(ctx=interaction, message="This minion is no longer available.")
+            return None
+        try:
+            async with bot.db.acquire() as connection, connection.transaction():  # type: ignore
+                await LOCK_USER_CONFIGS.execute(connection, self.owner_id)
+                record: asyncpg.Record | None = await CLAIM_ANICARD.fetchrow(
+                    connection,
+                    self.owner_id,
+                    self.minion_id,
+                    self.tag,
+                    datetime.utcfromtimestamp(self.wished_at),
+                    minion.original_aniclass,
+                    self.codex,
+                )
+        except asyncpg.UniqueViolationError as error:
+            self.release_codexes(bot=bot, keep_own=codex_rejected(error))
+            await message.Send.error(
+                ctx=interaction,
+                message="This Anicard could not be added to your collection. Please try again later.",
+            )
+            return None
+        if record is None:
+            # Another button of this wish was claimed first.
+            return None
+        self.release_codexes(bot=bot)
+        bot.collection_indexes.add(  # type: ignore
+            user_id=self.owner_id,
+            anicard=Anicard(**record, character=minion.character, anime=minion.anime),
+        )
+
+        wish_success_message = f"`{minion.character}` with Tag of `{self.tag}` has been added to your collection!"
+        await message.Send.success(ctx=interaction, message=wish_success_message)